@@ -38,38 +38,51 @@ class TextPrint:
         self.x -= 10
 
 
-def move_to_complete(arm):
-    print("Move Complete")
-
-
-def button_down(arm, button_num):
+def button_down(held, button_num):
     config = JoyConfig()
 
     if button_num < len(config.buttons):
         print(button_num)
         if config.buttons[button_num] != None:
             print(config.buttons[button_num].axis)
-            current_arm = arm.arm_get(block=False)
-            if current_arm != None:
-                current_axises = current_arm.position
-                if config.buttons[button_num].axis == AxisType.BASE:
-                    current_axises.base.counts += config.buttons[button_num].counts
-                elif config.buttons[button_num].axis == AxisType.WRIST_ROLL:
-                    current_axises.wrist_roll.counts += config.buttons[button_num].counts
-                elif config.buttons[button_num].axis == AxisType.WRIST_PITCH:
-                    current_axises.wrist_pitch.counts += config.buttons[button_num].counts
-                elif config.buttons[button_num].axis == AxisType.SHOULDER:
-                    current_axises.shoulder.counts += config.buttons[button_num].counts
-                arm.move_to_axises_cmd(
-                    10, axises=current_axises, cb=move_to_complete)
-
-            # arm.move_inc_cmd(
-            #     config.buttons[button_num].axis, 50, config.buttons[button_num].counts)
-
+            held[button_num] = config.buttons[button_num]
         else:
             print("Button Not Defined")
 
 
+def button_up(arm, held, button_num):
+    key_map = held.pop(button_num, None)
+    if key_map != None:
+        arm.jog(key_map.axis, 0)
+
+
+def jog_update(arm, joysticks, held):
+    """
+    Send the current joystick and button jog velocities to the Arm.
+
+    Called every frame so the jog dead-man timer doesn't expire while an
+    input is held.
+    """
+    config = JoyConfig()
+    velocities = {}
+
+    for joystick in joysticks.values():
+        for i in range(min(joystick.get_numaxes(), len(config.axes))):
+            axis_map = config.axes[i]
+            if axis_map != None:
+                value = joystick.get_axis(i)
+                if abs(value) < config.DEAD_ZONE:
+                    value = 0
+                velocities[axis_map.axis] = value * axis_map.scale
+
+    # Held buttons override the joystick axes.
+    for key_map in held.values():
+        velocities[key_map.axis] = key_map.velocity
+
+    for axis, velocity in velocities.items():
+        arm.jog(axis, velocity)
+
+
 def main():
 
     PORT = '/dev/cu.usbserial-FT5ZVFRV'
@@ -98,6 +111,9 @@ def main():
     # at the start of the program.
     joysticks = {}
 
+    # Buttons which are currently held down.
+    held = {}
+
     done = False
     while not done:
         # Event processing step.
@@ -109,11 +125,11 @@ def main():
 
             if event.type == pygame.JOYBUTTONDOWN:
                 print("Press")
-                button_down(arm, event.button)
+                button_down(held, event.button)
 
             if event.type == pygame.JOYBUTTONUP:
                 print("Release")
-                arm.stop_cmd()
+                button_up(arm, held, event.button)
 
             # Handle hotplugging
             if event.type == pygame.JOYDEVICEADDED:
@@ -127,6 +143,8 @@ def main():
                 del joysticks[event.instance_id]
                 print(f"Joystick {event.instance_id} disconnected")
 
+        jog_update(arm, joysticks, held)
+
         # Drawing step
         # First, clear the screen to white. Don't put other drawing commands
         # above this, or they will be erased with this command.
@@ -4,34 +4,46 @@ from lv5250.axis import *
 
 
 class JoyKeyMap:
-    def __init__(self, counts: int, axis: AxisType):
-        # Number of counts to move the axis by
-        self.counts = int(counts)
+    def __init__(self, velocity: float, axis: AxisType):
+        # Jog velocity while the button is held, -1.0 to 1.0
+        self.velocity = float(velocity)
         # Which axis to move move when the button is pressed.
         self.axis = AxisType(axis)
 
 
+class JoyAxisMap:
+    def __init__(self, scale: float, axis: AxisType):
+        # Joystick axis value to jog velocity scale.  A negative value
+        # reverses the direction.
+        self.scale = float(scale)
+        # Which arm axis to jog with the joystick axis.
+        self.axis = AxisType(axis)
+
+
 class JoyConfig:
 
+    # Joystick axis values smaller than the dead zone are ignored.
+    DEAD_ZONE = 0.1
+
     def __init__(self):
         # Buttons
         self.buttons = [
             # Button 0
-            JoyKeyMap(-40000, AxisType.ELBOW),
+            JoyKeyMap(-1.0, AxisType.ELBOW),
             # Button 1
-            JoyKeyMap(-40000, AxisType.WRIST_PITCH),
+            JoyKeyMap(-1.0, AxisType.WRIST_PITCH),
             # Button 2
-            JoyKeyMap(40000, AxisType.ELBOW),
+            JoyKeyMap(1.0, AxisType.ELBOW),
             # Button 3
-            JoyKeyMap(40000, AxisType.WRIST_PITCH),
+            JoyKeyMap(1.0, AxisType.WRIST_PITCH),
             # Button 4
-            JoyKeyMap(-40000, AxisType.SHOULDER),
+            JoyKeyMap(-1.0, AxisType.SHOULDER),
             # Button 5
-            JoyKeyMap(40000, AxisType.SHOULDER),
+            JoyKeyMap(1.0, AxisType.SHOULDER),
             # Button 6
-            JoyKeyMap(40000, AxisType.BASE),
+            JoyKeyMap(1.0, AxisType.BASE),
             # Button 7
-            JoyKeyMap(-40000, AxisType.BASE),
+            JoyKeyMap(-1.0, AxisType.BASE),
             # Button 8
             None,
             # Button 9
@@ -41,3 +53,15 @@ class JoyConfig:
             # Button 11
             None
         ]
+
+        # Joystick Axes
+        self.axes = [
+            # Axis 0 - Left Stick X
+            JoyAxisMap(1.0, AxisType.BASE),
+            # Axis 1 - Left Stick Y
+            JoyAxisMap(-1.0, AxisType.SHOULDER),
+            # Axis 2 - Right Stick X
+            JoyAxisMap(1.0, AxisType.WRIST_ROLL),
+            # Axis 3 - Right Stick Y
+            JoyAxisMap(-1.0, AxisType.ELBOW),
+        ]
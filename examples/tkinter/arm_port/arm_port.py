@@ -9,6 +9,7 @@ from lv5250.axis import *
 from lv5250.arm_manager import *
 from lv5250.axises import *
 from lv5250.arm import *
+from lv5250.arm_discover import *
 
 import serial
 import serial.tools.list_ports
@@ -20,9 +21,14 @@ class ArmPort():
         print("test press")
         selected = self.port_lb.curselection()
         print(selected)
-        if selected != None:
+        if selected:
             port = self.ports[selected[0]].device
             print(f'Port:{port}')
+            status = port_probe(port)
+            if status is None:
+                print('No Arm Found')
+            else:
+                print(f'Arm Found: {status.position}')
 
     def __init__(self):
         super().__init__()
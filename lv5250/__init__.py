@@ -1,3 +1,12 @@
 """LabVolt 5250 Robot Arm Python Package"""
 
 __version__ = "0.1"
+
+
+def __getattr__(name):
+    # lv5250.discover() is imported on first use so importing the package
+    # stays light.
+    if name == 'discover':
+        from lv5250.arm_discover import discover
+        return discover
+    raise AttributeError(f"module 'lv5250' has no attribute '{name}'")
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import time
+
+from lv5250 import *
+from lv5250.arm_clock import *
+from lv5250.arm_config import ArmConfig
+
+
+def calibration_fingerprint(port: str) -> str:
+    """
+    Returns the session fingerprint for a port.  The fingerprint covers the
+    port and the ArmConfig axis limits so a saved calibration isn't trusted
+    for a different Arm connection or after the limits are changed.
+    """
+    names = sorted(name for name in vars(ArmConfig) if name.isupper())
+    text = str(port) + ';' + ';'.join(
+        '{}={}'.format(name, getattr(ArmConfig, name)) for name in names)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class ArmCalibration:
+    """
+    Persisted Arm Calibration State
+
+    The last trusted Arm state, saved so a restarted application can skip the
+    Hard Home if the Arm kept its position.  The Arm controller's encoder
+    counts restart at zero when it is powered up, so the saved position is
+    only trusted if the Arm reports the same position and limit switch
+    state.  A saved position at the zero position is never trusted since it
+    can't be told apart from a power cycle.
+
+    Parameters:
+    fingerprint: The session fingerprint, see calibration_fingerprint().
+    homed: Has the Arm completed a Hard Home?
+    command: The last commanded (gripper, wrist_roll, wrist_pitch, elbow,
+    shoulder, base) counts.
+    position: The last measured counts in the same order.
+    limits: The last limit switch bits.
+    """
+
+    VERSION = 1
+
+    # The maximuim position difference for the saved position to be trusted
+    # (encoder counts)
+    TOLERANCE = 200
+
+    def __init__(self,
+                 fingerprint: str,
+                 homed: bool = False,
+                 command: tuple = (0,) * 6,
+                 position: tuple = (0,) * 6,
+                 limits: int = 0):
+        self.fingerprint = fingerprint
+        self.homed = bool(homed)
+        self.command = tuple(int(value) for value in command)
+        self.position = tuple(int(value) for value in position)
+        self.limits = int(limits)
+        self.saved = 0.0
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a saved calibration.  Returns None if the file doesn't exist or
+        can't be read.
+        """
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data.get('version') != cls.VERSION:
+                print('Unsupported Calibration Version: {}'.format(data.get('version')))
+                return None
+            calibration = cls(data['fingerprint'],
+                              data['homed'],
+                              data['command'],
+                              data['position'],
+                              data['limits'])
+            calibration.saved = float(data.get('saved', 0.0))
+            return calibration
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print('Error Loading Calibration: ' + str(e))
+            return None
+
+    def save(self, path: str) -> None:
+        """
+        Save the calibration.  The file is replaced atomically so a crash
+        while saving leaves the previous calibration.  The save time is
+        recorded unless it's already set.
+        """
+        if not self.saved:
+            self.saved = time.time()
+        data = {
+            'version': self.VERSION,
+            'fingerprint': self.fingerprint,
+            'homed': self.homed,
+            'command': list(self.command),
+            'position': list(self.position),
+            'limits': self.limits,
+            'saved': self.saved,
+        }
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(data, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print('Error Saving Calibration: ' + str(e))
+
+    def verify(self, fingerprint: str, position: tuple, limits: int) -> bool:
+        """
+        Can the saved calibration be trusted for the Arm's reported state?
+
+        Parameters:
+        fingerprint: The current session fingerprint.
+        position: The position counts reported by the Arm's status.
+        limits: The limit switch bits reported by the Arm's status.
+        """
+        if not self.homed or fingerprint != self.fingerprint:
+            return False
+        if limits != self.limits:
+            return False
+        if all(abs(value) <= self.TOLERANCE for value in self.position):
+            # Indistinguishable from a controller which was power cycled.
+            return False
+        return all(abs(reported - saved) <= self.TOLERANCE
+                   for reported, saved in zip(position, self.position))
+
+
+class CalibrationWriter:
+    """
+    Background Calibration Writer
+
+    Saves the calibrations on its own thread so the atomic write and fsync
+    don't hold up the serial link.  Only the most recent calibration
+    waiting to be written is kept, a newer calibration replaces it.
+
+    Parameters:
+    path: The file to save the calibrations in.
+    clock: Optional clock for the writer thread, such as a SimClock.
+    """
+
+    def __init__(self, path: str, clock: Clock = None):
+        self.path = path
+        self.clock = clock or REAL_CLOCK
+        self._cond = self.clock.condition()
+        self._pending = None
+        self._writing = False
+        # The writer thread is started on first use.
+        self._thread = None
+
+    def submit(self, calibration: ArmCalibration) -> None:
+        """
+        Save a calibration in the background.
+        """
+        with self._cond:
+            self._pending = calibration
+            if self._thread is None:
+                self._thread = self.clock.thread(self._write_loop)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait for the submitted calibrations to be written.  Returns False if
+        the timeout expired first.
+
+        Parameters:
+        timeout: The maximuim time to wait (seconds), None waits forever.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._writing, timeout)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                calibration = self._pending
+                self._pending = None
+                self._writing = True
+            try:
+                calibration.save(self.path)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
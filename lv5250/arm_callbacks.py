@@ -0,0 +1,173 @@
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lv5250 import *
+from lv5250.arm_clock import *
+from lv5250.arm_metrics import *
+
+
+class CallbackExecutor:
+    """
+    User Callback Executor
+
+    Runs the user level callbacks, such as the ArmManager final callbacks,
+    off the serial link's threads so a slow callback doesn't hold up the
+    link.  The link hands the callback over and moves on to the next
+    command.
+
+    Modes:
+    'queue': The callbacks run in order on a single thread from a bounded
+    queue.  When the queue is full the drop policy applies: 'oldest', the
+    default, drops the oldest queued callback, 'newest' drops the new
+    callback and 'block' waits for space, which holds up the link so is
+    only for callers that can't miss a callback.
+    'pool': The callbacks run on a pool of threads, not necessarily in
+    order.
+    'inline': The callbacks run on the calling thread.
+    An object with a submit(fn, *args) method, such as a
+    concurrent.futures.Executor, runs the callbacks itself.
+
+    The execution time of each callback is recorded by callback name so the
+    slow consumers can be found, along with the dropped callbacks.  A
+    callback which raises is reported and doesn't stop the executor.
+
+    Parameters:
+    executor: The mode or the executor to submit the callbacks to.
+    maxsize: The maximuim number of queued callbacks in 'queue' mode.
+    drop: The full queue policy, 'oldest', 'newest' or 'block'.
+    workers: The number of threads in 'pool' mode.
+    metrics: Optional registry to record the callback metrics in.
+    clock: Optional clock for the queue thread, such as a SimClock.
+    """
+
+    # Default queue size
+    MAXSIZE = 256
+
+    # Default pool size
+    WORKERS = 4
+
+    # Callback execution time buckets (seconds)
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    # Default full queue policy, never holds up the link
+    DROP = 'oldest'
+
+    DROP_POLICIES = ('block', 'oldest', 'newest')
+
+    def __init__(self,
+                 executor='queue',
+                 maxsize: int = MAXSIZE,
+                 drop: str = DROP,
+                 workers: int = WORKERS,
+                 metrics: MetricsRegistry = None,
+                 clock: Clock = None):
+        if drop not in self.DROP_POLICIES:
+            raise ValueError(f'Unknown Drop Policy: {drop}')
+        self.clock = clock or REAL_CLOCK
+        self.maxsize = max(1, int(maxsize))
+        self.drop = drop
+        self._closed = False
+        metrics = metrics or MetricsRegistry()
+        self._seconds = metrics.histogram(
+            'lv5250_callback_seconds', 'User callback execution time by callback.',
+            self.BUCKETS, ('callback',))
+        self._dropped = metrics.counter(
+            'lv5250_callbacks_dropped_total',
+            'User callbacks dropped by a full queue by callback.', ('callback',))
+        self._errors = metrics.counter(
+            'lv5250_callback_errors_total', 'User callbacks which raised by callback.',
+            ('callback',))
+
+        self._queue = None
+        self._executor = None
+        self._thread = None
+        if executor == 'queue':
+            self._queue = collections.deque()
+            self._cond = self.clock.condition()
+            metrics.gauge('lv5250_callback_queue_depth',
+                          'User callbacks waiting to run.', func=self._queue.__len__)
+            self._thread = self.clock.thread(self._queue_loop)
+            self._thread.start()
+        elif executor == 'pool':
+            self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)),
+                                                thread_name_prefix='lv5250-callback')
+        elif executor == 'inline':
+            pass
+        elif callable(getattr(executor, 'submit', None)):
+            self._executor = executor
+        else:
+            raise ValueError(f'Unknown Callback Executor: {executor}')
+        self.mode = executor if isinstance(executor, str) else 'executor'
+
+    def submit(self, cb, *args) -> bool:
+        """
+        Run a callback with the arguments.  Returns False if the callback
+        was dropped.
+        """
+        if self._queue is not None:
+            return self._enqueue(cb, args)
+        if self._executor is not None:
+            self._executor.submit(self._run, cb, args)
+        else:
+            self._run(cb, args)
+        return True
+
+    def close(self) -> None:
+        """
+        Stop the executor once the queued callbacks have run.  A caller
+        supplied executor isn't shut down.
+        """
+        self._closed = True
+        if self._queue is not None:
+            with self._cond:
+                self._cond.notify_all()
+            self._thread.join(timeout=5.0)
+        elif self.mode == 'pool':
+            self._executor.shutdown(wait=True)
+
+    def _enqueue(self, cb, args) -> bool:
+        queue = self._queue
+        with self._cond:
+            if len(queue) >= self.maxsize:
+                if self.drop == 'newest':
+                    self._dropped.inc(_callback_name(cb))
+                    return False
+                if self.drop == 'oldest':
+                    dropped, _ = queue.popleft()
+                    self._dropped.inc(_callback_name(dropped))
+                else:
+                    self._cond.wait_for(
+                        lambda: len(queue) < self.maxsize or self._closed)
+            queue.append((cb, args))
+            self._cond.notify_all()
+        return True
+
+    def _queue_loop(self):
+        queue = self._queue
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: queue or self._closed)
+                if not queue:
+                    return
+                cb, args = queue.popleft()
+                # Wake a submitter waiting for space.
+                self._cond.notify_all()
+            self._run(cb, args)
+
+    def _run(self, cb, args):
+        name = _callback_name(cb)
+        start = time.perf_counter()
+        try:
+            cb(*args)
+        except Exception as e:
+            self._errors.inc(name)
+            print("Callback Error: {}: {}".format(name, e))
+        finally:
+            self._seconds.observe(time.perf_counter() - start, name)
+
+
+def _callback_name(cb) -> str:
+    # Bound methods and functions have a qualified name, other callables
+    # are named by their type.
+    return getattr(cb, '__qualname__', None) or type(cb).__name__
@@ -0,0 +1,308 @@
+import math
+import queue
+import threading
+import time
+
+from lv5250 import *
+
+
+class Clock:
+    """
+    Real Time Clock
+
+    The time source, sleeps and blocking primitives used by the serial link,
+    the ArmManager and the ArmSim.  The stack uses the shared REAL_CLOCK
+    unless a SimClock is passed in to run a simulated session faster than
+    real time.
+    """
+
+    def monotonic(self) -> float:
+        """
+        Returns the current time (seconds)
+        """
+        return time.monotonic()
+
+    def time(self) -> float:
+        """
+        Returns the wall clock time (seconds since the epoch)
+        """
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def event(self):
+        return threading.Event()
+
+    def condition(self, lock=None):
+        return threading.Condition(lock)
+
+    def queue(self, queue_class=queue.Queue, maxsize: int = 0):
+        return queue_class(maxsize)
+
+    def thread(self, target, daemon: bool = True):
+        return threading.Thread(target=target, daemon=daemon)
+
+
+REAL_CLOCK = Clock()
+
+
+class SimClock(Clock):
+    """
+    Simulated Clock
+
+    A virtual clock which only advances when every thread taking part in the
+    simulation is waiting, it then jumps to the earliest wait deadline.  The
+    waits and sleeps take no real time so a long session against an ArmSim
+    on a loop:// transport replays in a fraction of the real time while the
+    commands keep their relative timing.
+
+    The threads taking part are the thread which created the clock and the
+    threads created with thread().  They must only block through the clock's
+    sleep() and its events, conditions and queues, a thread blocked any
+    other way, such as on a serial port, stops the clock.  The clock can't
+    be used with the serial and TCP transports.
+
+    Parameters:
+    start: The initial time (seconds)
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._cond = threading.Condition()
+        self._now = float(start)
+        self._local = threading.local()
+        self._local.participant = True
+        # The number of participating threads and how many are waiting.
+        self._running = 1
+        self._blocked = 0
+        # The (predicate, deadline) of each waiting thread.
+        self._waiters = []
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def time(self) -> float:
+        # The simulated time stands in for the wall clock time.
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        self.wait_for(_never, seconds)
+
+    def event(self):
+        return _SimEvent(self)
+
+    def condition(self, lock=None):
+        return _SimCondition(self, lock)
+
+    def queue(self, queue_class=queue.Queue, maxsize: int = 0):
+        sim_queue = _sim_queue_class(queue_class)(maxsize)
+        sim_queue._sim_init(self)
+        return sim_queue
+
+    def thread(self, target, daemon: bool = True):
+        """
+        Create a thread which takes part in the simulation.  The thread is
+        counted from when it's created so the clock doesn't advance before
+        it starts.
+        """
+        def run():
+            self._local.participant = True
+            try:
+                target()
+            finally:
+                self.release()
+
+        with self._cond:
+            self._running += 1
+        return threading.Thread(target=run, daemon=daemon)
+
+    def release(self) -> None:
+        """
+        Stop the calling thread taking part in the simulation, for example
+        the thread which created the clock once it's finished.
+        """
+        with self._cond:
+            if getattr(self._local, 'participant', False):
+                self._local.participant = False
+                self._running -= 1
+                self._advance()
+
+    def wait_for(self, predicate, timeout: float = None) -> bool:
+        """
+        Wait until a predicate is true or the timeout expires, returns the
+        last predicate result.  The predicate is evaluated with the clock's
+        lock held, possibly by another thread, so it must be quick and must
+        not block.  The state it depends on must be changed through the
+        clock's primitives, or followed by notify(), to wake the waiter.
+        """
+        with self._cond:
+            if predicate():
+                return True
+            if timeout is not None and timeout <= 0:
+                return False
+            deadline = None if timeout is None else self._now + timeout
+            if deadline is not None and deadline <= self._now:
+                # The timeout is too small to change the time, wait for the
+                # next time instead so the clock advances.
+                deadline = math.nextafter(self._now, math.inf)
+            waiter = (predicate, deadline)
+            participant = getattr(self._local, 'participant', False)
+            if not participant:
+                # Counted while it waits so it neither stops nor advances
+                # the clock.
+                self._running += 1
+            self._blocked += 1
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    self._advance()
+                    self._cond.wait()
+                    if predicate():
+                        return True
+                    if deadline is not None and self._now >= deadline:
+                        return False
+            finally:
+                self._waiters.remove(waiter)
+                self._blocked -= 1
+                if not participant:
+                    self._running -= 1
+
+    def notify(self) -> None:
+        """
+        Wake the waiting threads to check their predicates.
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+    def _advance(self):
+        # Called with the lock held.
+        if self._blocked < self._running:
+            return
+        deadline = None
+        for predicate, waiter_deadline in self._waiters:
+            if predicate():
+                # A waiting thread can run.
+                self._cond.notify_all()
+                return
+            if waiter_deadline is not None:
+                if waiter_deadline <= self._now:
+                    self._cond.notify_all()
+                    return
+                if deadline is None or waiter_deadline < deadline:
+                    deadline = waiter_deadline
+        if deadline is not None:
+            self._now = deadline
+            self._cond.notify_all()
+
+
+def _never() -> bool:
+    return False
+
+
+class _SimEvent:
+    """
+    threading.Event for a SimClock.
+    """
+
+    def __init__(self, clock: SimClock):
+        self._clock = clock
+        self._flag = False
+
+    def is_set(self) -> bool:
+        return self._flag
+
+    def set(self) -> None:
+        self._flag = True
+        self._clock.notify()
+
+    def clear(self) -> None:
+        self._flag = False
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._clock.wait_for(self.is_set, timeout)
+
+
+class _SimCondition:
+    """
+    threading.Condition for a SimClock.  Every notify wakes all of the
+    waiters, which is allowed since waiters must recheck their condition.
+    """
+
+    def __init__(self, clock: SimClock, lock=None):
+        self._clock = clock
+        self._lock = lock if lock is not None else threading.RLock()
+        self._generation = 0
+        self.acquire = self._lock.acquire
+        self.release = self._lock.release
+
+    def __enter__(self):
+        return self._lock.__enter__()
+
+    def __exit__(self, *args):
+        return self._lock.__exit__(*args)
+
+    def wait(self, timeout: float = None) -> bool:
+        generation = self._generation
+        self._lock.release()
+        try:
+            return self._clock.wait_for(
+                lambda: self._generation != generation, timeout)
+        finally:
+            self._lock.acquire()
+
+    def wait_for(self, predicate, timeout: float = None):
+        clock = self._clock
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        result = predicate()
+        while not result:
+            if deadline is None:
+                self.wait()
+            else:
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    break
+                self.wait(remaining)
+            result = predicate()
+        return result
+
+    def notify(self, n: int = 1) -> None:
+        self.notify_all()
+
+    def notify_all(self) -> None:
+        self._generation += 1
+        self._clock.notify()
+
+
+class _SimQueueMixin:
+    """
+    Replaces a queue's conditions with SimClock conditions.
+    """
+
+    def _sim_init(self, clock: SimClock):
+        self.not_empty = _SimCondition(clock, self.mutex)
+        self.not_full = _SimCondition(clock, self.mutex)
+        self.all_tasks_done = _SimCondition(clock, self.mutex)
+
+    def get(self, block=True, timeout=None):
+        # queue.Queue.get() measures its timeout in real time.
+        with self.not_empty:
+            if not block or timeout is not None and timeout <= 0:
+                if not self._qsize():
+                    raise queue.Empty
+            elif not self.not_empty.wait_for(self._qsize, timeout):
+                raise queue.Empty
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
+_sim_queue_classes = {}
+
+
+def _sim_queue_class(queue_class):
+    sim_class = _sim_queue_classes.get(queue_class)
+    if sim_class is None:
+        sim_class = type('Sim' + queue_class.__name__,
+                         (_SimQueueMixin, queue_class), {})
+        _sim_queue_classes[queue_class] = sim_class
+    return sim_class
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from lv5250 import *
+from lv5250.arm_status import *
+from lv5250.arm_transport import *
+
+
+# The maximuim time to wait for an Arm to respond to the probe (seconds)
+PROBE_TIMEOUT = 0.5
+
+
+class DiscoveredArm(NamedTuple):
+    """
+    An Arm found by discover().
+
+    port: The port name or transport URL the Arm responded on.
+    description: The port description, empty if not known.
+    status: The Arm's response to the status command.
+    """
+    port: str
+    description: str
+    status: ArmStatus
+
+
+def ports_list() -> list:
+    """
+    Returns the (device, description) of each serial port on the host.
+    pyserial is only imported when the ports are listed.
+    """
+    import serial.tools.list_ports
+    return [(port.device, port.description or '')
+            for port in serial.tools.list_ports.comports()]
+
+
+def port_probe(port: str, timeout: float = PROBE_TIMEOUT) -> ArmStatus:
+    """
+    Probe a port for an Arm by sending the status command.  Returns the
+    decoded status or None if the port couldn't be opened or there wasn't a
+    status response within the timeout.
+
+    Parameters:
+    port: The port name or transport URL, see transport_open().
+    timeout: The maximuim time to wait for the response (seconds)
+    """
+    try:
+        transport = transport_open(port, timeout=timeout)
+    except (OSError, ValueError):
+        return None
+    clock = transport.clock
+    deadline = clock.monotonic() + timeout
+    try:
+        # Drop anything received before the probe.
+        transport.read_all()
+        transport.write(b'?\r\n')
+        while True:
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                return None
+            # Each line wait is limited to the time remaining.
+            transport.timeout = remaining
+            line = transport.readline().decode('ascii', 'replace').strip()
+            status = ArmStatus.parse(line)
+            if status is not None:
+                return status
+    except OSError:
+        return None
+    finally:
+        try:
+            transport.close()
+        except OSError:
+            pass
+
+
+def discover(ports=None, timeout: float = PROBE_TIMEOUT) -> list:
+    """
+    Find the Arms attached to the host.
+
+    Each port is probed at the same time on its own thread so the discovery
+    takes about one timeout however many ports there are.
+
+    Parameters:
+    ports: Optional port names or transport URLs to probe, defaults to all
+    of the host's serial ports.
+    timeout: The maximuim time to wait for each Arm to respond (seconds)
+
+    Returns:
+    A DiscoveredArm for each port which responded, in port order.
+    """
+    if ports is None:
+        candidates = ports_list()
+    else:
+        candidates = [(port, '') for port in ports]
+    if not candidates:
+        return []
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        statuses = list(executor.map(
+            lambda candidate: port_probe(candidate[0], timeout), candidates))
+    return [DiscoveredArm(port, description, status)
+            for (port, description), status in zip(candidates, statuses)
+            if status is not None]
@@ -0,0 +1,172 @@
+from lv5250 import *
+from lv5250.axis import *
+from lv5250.axises import *
+from lv5250.arm_snapshot import *
+
+
+class ArmGuard:
+    """
+    Following Error and Near Limit Monitor
+
+    Checks each position or status sample and sends an immediate Stop, see
+    ArmManager.stop_now_cmd(), before an axis trips a limit switch or while
+    an axis is blocked by an obstacle.
+
+    Each axis velocity is estimated from successive samples.  An axis is
+    stopped if its position predicted at the next sample, plus LOOKAHEAD to
+    cover the Stop latency, is past its limits.  Only the axises with limit
+    switches are checked.  An axis which was moving towards its commanded
+    position and stops short of it by more than FOLLOWING_ERROR is treated
+    as a collision.  The Jog commands don't set the commanded position so
+    an axis moving away from its command isn't a following error.
+
+    The guard is only active while the Arm is homed since the limits and
+    commanded positions aren't valid before the Hard Home.  While the guard
+    is started the position is polled every poll_interval during the RUN
+    moves, see ArmManager.move_poll_interval, so a move is checked while it
+    runs.  The limits are checked quietly, nothing is printed for a sample
+    near a limit.
+
+    Parameters:
+    manager: The ArmManager to monitor.
+    lookahead: Time added to the sample interval when predicting the
+    position (seconds)
+    following_error: The distance from the commanded position which is a
+    collision if the axis stops (encoder counts)
+    poll_interval: The position poll interval during the RUN moves
+    (seconds)
+    axes: Optional AxisTypes to check for following errors.  The Gripper is
+    excluded by default since it stops short when it grips an object.
+    cb: Optional function of the form callback(axis : AxisType, reason :
+    str, snapshot : ArmSnapshot) called after a Stop is sent.
+    """
+
+    # Time added to the sample interval when predicting the position
+    # (seconds)
+    LOOKAHEAD = 0.1
+
+    # Following error treated as a collision (encoder counts)
+    FOLLOWING_ERROR = 2000
+
+    # Axis speed below which an axis is stopped (encoder counts per second)
+    STOPPED_SPEED = 100
+
+    # Samples further apart are not used to estimate the velocity (seconds)
+    SAMPLE_MAX_INTERVAL = 1.0
+
+    # Position poll interval during the RUN moves (seconds)
+    POLL_INTERVAL = 0.1
+
+    def __init__(self,
+                 manager,
+                 lookahead: float = LOOKAHEAD,
+                 following_error: int = FOLLOWING_ERROR,
+                 poll_interval: float = POLL_INTERVAL,
+                 axes=None,
+                 cb=None):
+        self.manager = manager
+        self.lookahead = float(lookahead)
+        self.following_error = abs(int(following_error))
+        self.poll_interval = float(poll_interval)
+        # The manager's move poll interval before the guard was started.
+        self._move_poll_interval = None
+        if axes is None:
+            axes = [axis for axis in AxisType if axis != AxisType.GRIPPER]
+        self.indexes = tuple(AxisType(axis).value for axis in axes)
+        self.cb = cb
+        # The axises with limit switches.
+        self._limit_indexes = tuple(axis.value for axis in (
+            AxisType.WRIST_PITCH, AxisType.ELBOW, AxisType.SHOULDER, AxisType.BASE))
+        # Axises with the limits enabled, used to test predicted positions.
+        self._limits = Axises(True)
+        self._axises = (self._limits.gripper, self._limits.wrist_roll,
+                        self._limits.wrist_pitch, self._limits.elbow,
+                        self._limits.shoulder, self._limits.base)
+        self._position = None
+        self._time = 0.0
+        # Was each axis last seen moving towards its command?
+        self._approaching = [False] * 6
+        # Set after a Stop until the Arm has stopped.
+        self._stopped = False
+        self._stops = manager.metrics.counter(
+            'lv5250_guard_stops_total', 'Guard Stops by axis and reason.',
+            ('axis', 'reason'))
+
+    def start(self) -> None:
+        """
+        Start checking the samples.
+        """
+        self._move_poll_interval = self.manager.move_poll_interval
+        intervals = [interval for interval in (self._move_poll_interval,
+                                               self.poll_interval) if interval]
+        self.manager.move_poll_interval = min(intervals) if intervals else None
+        self.manager.sample_cb_add(self._sample_cb)
+
+    def stop(self) -> None:
+        """
+        Stop checking the samples.
+        """
+        self.manager.sample_cb_remove(self._sample_cb)
+        self.manager.move_poll_interval = self._move_poll_interval
+        self._position = None
+
+    def _sample_cb(self, snapshot: ArmSnapshot):
+        now = self.manager.clock.monotonic()
+        position = snapshot.position
+        previous = self._position
+        interval = now - self._time
+        self._position = position
+        self._time = now
+        if (previous is None or not self.manager.homed
+                or interval <= 0 or interval > self.SAMPLE_MAX_INTERVAL):
+            self._approaching = [False] * 6
+            return
+        if position is previous and not any(self._approaching):
+            # Unchanged, the snapshots share the position when it hasn't
+            # changed.
+            self._stopped = False
+            return
+
+        velocities = [(new - old) / interval for new, old in zip(position, previous)]
+        moving = [abs(velocity) >= self.STOPPED_SPEED for velocity in velocities]
+        if self._stopped:
+            # Wait for the Arm to stop after a Stop.
+            self._stopped = any(moving)
+            self._approaching = [False] * 6
+            return
+
+        if any(moving):
+            # The relative limits depend on the current positions.
+            self._limits.counts_set(position, quiet=True)
+            horizon = interval + self.lookahead
+            for index in self._limit_indexes:
+                if not moving[index]:
+                    continue
+                velocity = velocities[index]
+                axis = self._axises[index]
+                predicted = int(position[index] + velocity * horizon)
+                overshoot = abs(predicted - axis.counts_resolve(predicted, True))
+                if overshoot and overshoot > abs(
+                        position[index] - axis.counts_resolve(position[index], True)):
+                    self._trip(AxisType(index), 'limit', snapshot)
+                    return
+
+        command = snapshot.command
+        for index in self.indexes:
+            error = command[index] - position[index]
+            if moving[index]:
+                self._approaching[index] = velocities[index] * error > 0
+            elif self._approaching[index]:
+                self._approaching[index] = False
+                if abs(error) > self.following_error:
+                    self._trip(AxisType(index), 'following_error', snapshot)
+                    return
+
+    def _trip(self, axis: AxisType, reason: str, snapshot: ArmSnapshot):
+        self.manager.stop_now_cmd()
+        print('Guard Stop: {} {}'.format(axis.name, reason))
+        self._stopped = True
+        self._approaching = [False] * 6
+        self._stops.inc(axis.name.lower(), reason)
+        if callable(self.cb):
+            self.cb(axis, reason, snapshot)
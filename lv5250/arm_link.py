@@ -0,0 +1,320 @@
+import collections
+from enum import Enum
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from lv5250 import *
+from lv5250.arm_clock import *
+
+
+class MsgClass(Enum):
+    """
+    Serial Link Message Classes in priority order.
+    """
+    STOP = 0            # Stop commands, always sent first.
+    MOTION = 1          # Motion and Arm state changing commands.
+    HOUSEKEEPING = 2    # Session commands (REMOTE, TORQUE, FREE, etc.)
+    TELEMETRY = 3       # Position and status polling.
+
+
+class MsgResult(Enum):
+    """
+    Serial Link Message Outcomes.
+    """
+    COMPLETED = 0       # The anticipated response was received.
+    TIMEOUT = 1         # No response within the timeout or the link failed.
+    CANCELLED = 2       # Shed, cancelled by a Stop or interrupted.
+
+
+def msg_class_get(command: str) -> MsgClass:
+    """
+    Returns the message class for an Arm command string.
+
+    Commands which are generated when the message is sent (None) are
+    assumed to be motion commands.
+    """
+    if command is None:
+        return MsgClass.MOTION
+    words = command.split()
+    if len(words) == 0:
+        return MsgClass.HOUSEKEEPING
+    if words[0] == 'STOP':
+        return MsgClass.STOP
+    if words[0] in ('RUN', 'MOVE', 'HARDHOME'):
+        return MsgClass.MOTION
+    if words[0] == '?' or command.startswith('GET POS'):
+        return MsgClass.TELEMETRY
+    return MsgClass.HOUSEKEEPING
+
+
+class LinkRate:
+    """
+    Sliding Window Byte Rate Tracker
+
+    Parameters:
+    window: The averaging window (seconds)
+    """
+
+    def __init__(self, window: float = 1.0):
+        self._window = float(window)
+        self._samples = collections.deque()
+        self._total = 0
+
+    def add(self, count: int, now: float):
+        """
+        Add a number of bytes transferred at time now.
+        """
+        self._samples.append((now, count))
+        self._total += count
+        self._expire(now)
+
+    def rate(self, now: float) -> float:
+        """
+        Returns the byte rate over the window (bytes per second)
+        """
+        self._expire(now)
+        return self._total / self._window
+
+    def _expire(self, now: float):
+        while self._samples and now - self._samples[0][0] > self._window:
+            self._total -= self._samples.popleft()[1]
+
+
+class LinkScheduler:
+    """
+    Bandwidth Aware Serial Link Message Scheduler
+
+    Replaces a simple FIFO message queue.  The bytes sent and received by
+    each message class are tracked and the next message to send is selected
+    as follows:
+
+    1. Stop, Motion and Housekeeping messages are sent in the order they
+    were queued since they all change the Arm state, a queued Stop stops
+    the moves queued before it and not the moves queued after it.  Stop and
+    Motion messages are never deferred.  Housekeeping messages are deferred
+    while they exceed their budget and telemetry is waiting.  To cancel the
+    waiting moves, such as for an immediate Stop, use motion_cancel().
+
+    2. Telemetry messages are only sent when no other messages are waiting
+    and the telemetry budget has not been exceeded, so polling never delays
+    a move.  The oldest telemetry messages are shed if too many are waiting.
+
+    Budgets are a fraction of the link capacity used by a class in both
+    directions combined.
+
+    Parameters:
+    baudrate: The serial link baud rate.
+    budgets: Dictionary of MsgClass to link capacity fraction which
+    overrides the default budgets.
+    clock: Optional clock, such as a SimClock.
+    """
+
+    # Maximuim number of queued telemetry messages before the oldest are
+    # shed.
+    TELEMETRY_MAX = 4
+
+    # Default link capacity budgets.
+    BUDGETS = {
+        MsgClass.STOP: 1.0,
+        MsgClass.MOTION: 1.0,
+        MsgClass.HOUSEKEEPING: 0.5,
+        MsgClass.TELEMETRY: 0.5,
+    }
+
+    def __init__(self, baudrate: int = 9600, budgets: dict = None,
+                 clock: Clock = None):
+        self.clock = clock or REAL_CLOCK
+        # 10 bits per byte: start bit, 8 data bits & stop bit.
+        self.capacity = baudrate / 10
+        self.budgets = dict(self.BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+
+        self._cond = self.clock.condition()
+        self._ordered = collections.deque()
+        self._telemetry = collections.deque()
+
+        # Byte rates by class and by direction.
+        self._class_rates = {msg_class: LinkRate() for msg_class in MsgClass}
+        self._tx_rate = LinkRate()
+        self._rx_rate = LinkRate()
+
+        # Number of telemetry messages shed.
+        self.shed_count = 0
+
+    def put(self, message):
+        """
+        Add a message to the scheduler.
+        """
+        shed = []
+        with self._cond:
+            msg_class = message.msg_class
+            if msg_class == MsgClass.TELEMETRY:
+                self._telemetry.append(message)
+                while len(self._telemetry) > self.TELEMETRY_MAX:
+                    shed.append(self._telemetry.popleft())
+            else:
+                self._ordered.append(message)
+            self.shed_count += len(shed)
+            self._cond.notify()
+        for message in shed:
+            self._shed(message)
+
+    def get(self, block: bool = True, timeout: float = None):
+        """
+        Remove and return the next message to send.
+
+        Raises queue.Empty if no message can be sent before the timeout.
+        """
+        with self._cond:
+            deadline = None if timeout is None else self.clock.monotonic() + timeout
+            while True:
+                now = self.clock.monotonic()
+                message, wait = self._select(now)
+                if message is not None:
+                    break
+                if not block:
+                    raise queue.Empty
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+        return message
+
+    def motion_cancel(self) -> int:
+        """
+        Cancel the waiting Motion messages, for a Stop sent without the
+        scheduler.  Returns the number of messages cancelled.
+        """
+        with self._cond:
+            cancelled = self._motion_take()
+        for message in cancelled:
+            self._shed(message)
+        return len(cancelled)
+
+    def _motion_take(self) -> list:
+        # Called with the lock held.
+        cancelled = [message for message in self._ordered
+                     if message.msg_class == MsgClass.MOTION]
+        if cancelled:
+            self._ordered = collections.deque(
+                message for message in self._ordered
+                if message.msg_class != MsgClass.MOTION)
+        return cancelled
+
+    def _select(self, now: float):
+        """
+        Select the next message to send.
+
+        Returns:
+        A (message, wait) tuple.  The message is None if nothing can be sent
+        now and wait is the time until a deferred message may be sent or
+        None if no messages are waiting.
+        """
+        telemetry_ok = self._telemetry \
+            and self._within_budget(MsgClass.TELEMETRY, now)
+
+        if self._ordered:
+            head = self._ordered[0]
+            if telemetry_ok and head.msg_class == MsgClass.HOUSEKEEPING \
+                    and not self._within_budget(head.msg_class, now):
+                # Let telemetry through while the housekeeping budget
+                # recovers.
+                return self._telemetry.popleft(), None
+            return self._ordered.popleft(), None
+
+        if telemetry_ok:
+            return self._telemetry.popleft(), None
+        if self._telemetry:
+            # Telemetry deferred until its rate falls below the budget.
+            return None, 0.05
+        return None, None
+
+    def _within_budget(self, msg_class: MsgClass, now: float) -> bool:
+        budget = self.budgets.get(msg_class, 1.0) * self.capacity
+        return self._class_rates[msg_class].rate(now) < budget
+
+    def _shed(self, message):
+        """
+        Drop a shed or cancelled message.  The done callback is made with no
+        response and the message result set to MsgResult.CANCELLED.
+        """
+        message.result = MsgResult.CANCELLED
+        if callable(message.cb_done):
+            message.cb_done(message, None)
+
+    def clear(self):
+        """
+        Remove all waiting messages.
+        """
+        with self._cond:
+            self._ordered.clear()
+            self._telemetry.clear()
+
+    def qsize(self) -> int:
+        """
+        Returns the number of waiting messages.
+        """
+        with self._cond:
+            return self._count()
+
+    def _count(self) -> int:
+        return len(self._ordered) + len(self._telemetry)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def tx_record(self, msg_class: MsgClass, count: int):
+        """
+        Record a number of bytes sent for a message class.
+        """
+        with self._cond:
+            now = self.clock.monotonic()
+            self._tx_rate.add(count, now)
+            self._class_rates[msg_class].add(count, now)
+            # A deferred message may now be sendable.
+            self._cond.notify()
+
+    def rx_record(self, count: int):
+        """
+        Record a number of bytes received.
+        """
+        with self._cond:
+            self._rx_rate.add(count, self.clock.monotonic())
+
+    def resp_record(self, msg_class: MsgClass, count: int):
+        """
+        Record the size of a response to a message class.
+        """
+        with self._cond:
+            self._class_rates[msg_class].add(count, self.clock.monotonic())
+
+    def stats(self) -> dict:
+        """
+        Returns the link utilisation statistics.
+
+        tx_rate / rx_rate: Bytes per second in each direction.
+        tx_util / rx_util: Fraction of the link capacity in each direction.
+        class_rates: Bytes per second used by each message class.
+        queued: Number of waiting messages.
+        shed: Number of telemetry messages shed.
+        """
+        with self._cond:
+            now = self.clock.monotonic()
+            tx_rate = self._tx_rate.rate(now)
+            rx_rate = self._rx_rate.rate(now)
+            return {
+                'tx_rate': tx_rate,
+                'rx_rate': rx_rate,
+                'tx_util': tx_rate / self.capacity,
+                'rx_util': rx_rate / self.capacity,
+                'class_rates': {msg_class.name: rate.rate(now)
+                                for msg_class, rate in self._class_rates.items()},
+                'queued': self._count(),
+                'shed': self.shed_count,
+            }
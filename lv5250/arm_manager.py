@@ -3,6 +3,14 @@ from lv5250.arm import *
 from lv5250.axis import *
 from lv5250.axises import *
 from lv5250.arm_uart import *
+from lv5250.arm_program import *
+from lv5250.arm_metrics import *
+from lv5250.arm_snapshot import *
+from lv5250.arm_wait import *
+from lv5250.arm_calibration import *
+from lv5250.arm_status import *
+from lv5250.arm_clock import *
+from lv5250.arm_callbacks import *
 
 import queue
 import time
@@ -31,22 +39,46 @@ class IncMoveMsg:
     counts: The distance in encoder counts to move.
     """
 
+    __slots__ = ('axis', 'speed', 'counts')
+
     def __init__(self, axis: AxisType, speed: int, counts: int):
         self.axis = AxisType(axis)
         self.speed = limit_check(int(speed), 1, 99)
         self.counts = int(counts)
 
 
+class JogAxis:
+    """
+    Jog Axis State.
+    Stores the requested and last sent jog speed for a single axis.
+
+    Parameters:
+    axis:  The axis being jogged.
+    """
+
+    def __init__(self, axis: AxisType):
+        self.axis = AxisType(axis)
+        # The requested speed, -99 to 99 %
+        self.speed = 0
+        # The speed most recently sent to the Arm, -99 to 99 %
+        self.sent = 0
+        # The time of the most recent jog update (seconds)
+        self.updated = 0.0
+
+
 class ArmMngrMessage(ArmMessage):
     """
     Arm Message Subclass.
 
     Parameters:
     cb_final: The user level callback to make once the message as been sent and
-    a resp is received or or the message times out.
+    a resp is received or or the message times out.  The callback is passed
+    the current ArmSnapshot.
 
     """
 
+    __slots__ = ('cb_final', 'axises', 'inc_move', 'program', 'program_row')
+
     def __init__(self,
                  command: str,
                  timeout: int = 5,
@@ -57,53 +89,204 @@ class ArmMngrMessage(ArmMessage):
                  cb_other=None,
                  cb_final=None,
                  axises: Axises = None,
-                 inc_move: IncMoveMsg = None):
+                 inc_move: IncMoveMsg = None,
+                 program=None,
+                 msg_class: MsgClass = None,
+                 cb_poll=None,
+                 poll_interval: float = None,
+                 quiet: bool = False):
         super().__init__(command=command,
                          timeout=timeout,
                          resp=resp,
                          resp_ignore=resp_ignore,
                          cb_start=cb_start,
                          cb_done=cb_done,
-                         cb_other=cb_other)
+                         cb_other=cb_other,
+                         msg_class=msg_class,
+                         cb_poll=cb_poll,
+                         poll_interval=poll_interval,
+                         quiet=quiet)
         self.cb_final = cb_final
         # Absolute move command Axises
         self.axises = axises
         # Incremental move object for an incremental move command.
         self.inc_move = inc_move
+        # Program row iterator for a program command.
+        self.program = program
+        # The next program row to send.
+        self.program_row = None
 
 
 class ArmManager:
 
-    def __init__(self, port: str):
+    # Jog speeds are quantized to this step size (%) so small joystick
+    # changes don't generate a new MOVE command.
+    JOG_SPEED_STEP = 5
+
+    # Minimuim time between jog MOVE commands (seconds).  A MOVE command and
+    # its >OK response are around 20 bytes, or 20 ms at 9600 baud, so jogging
+    # uses at most a fifth of the link leaving the rest for telemetry.
+    JOG_CMD_INTERVAL = 0.1
+
+    # Jogging axises are stopped if they are not updated within the dead-man
+    # window (seconds)
+    JOG_DEADMAN = 0.5
+
+    # Minimuim time between calibration saves while homed (seconds)
+    CALIBRATION_SAVE_INTERVAL = 1.0
+
+    # Position poll interval during moves with an in position tolerance
+    # (seconds)
+    IN_POSITION_POLL_INTERVAL = 0.1
+
+    # Gripper position poll interval while waiting for the Gripper to stop
+    # (seconds)
+    GRIPPER_POLL_INTERVAL = 0.1
+
+    # The Gripper has stopped once its position stays within the tolerance
+    # (encoder counts) for the duration (milliseconds)
+    GRIPPER_STALL_DURATION = 300
+    GRIPPER_STALL_TOLERANCE = 20
+
+    # Response frame types counted by the unexpected response metric.
+    FRAME_TYPES = frozenset(('P', '?', 'ERR', 'ESTOP', '>LIMIT', 'GRIP_OBJECT',
+                             'END', '>END', '>OK', '>STEP'))
+
+    def __init__(self,
+                 port: str,
+                 budgets: dict = None,
+                 pool_size: int = 16,
+                 shm_name: str = None,
+                 metrics: MetricsRegistry = None,
+                 calibration_path: str = None,
+                 clock: Clock = None,
+                 callback_executor=None):
         """
         ArmManager Initializer
 
         Parameters:
-        port: String description of the port.
+        port: The port name or transport URL such as serial:///dev/ttyUSB0,
+        tcp://host:port or loop://, see transport_open().
+        budgets: Optional dictionary of MsgClass to serial link capacity
+        fraction which overrides the default link scheduler budgets.
+        pool_size: The number of free messages to keep for reuse by the
+        repeated Get Position, Get Status and Stop commands.  0 disables
+        message pooling.
+        shm_name: Optional shared memory block name.  If set each position
+        sample is published to the block for ArmShmReader's in other
+        processes.
+        metrics: Optional registry to record the metrics in, a new registry
+        is created if not supplied.
+        calibration_path: Optional file to persist the calibration state
+        in.  If set home_if_needed_cmd() skips the Hard Home when the Arm
+        still agrees with the saved state.
+        clock: Optional clock for the timeouts and sleeps.  A SimClock with
+        a loop:// port and an ArmSim runs a session faster than real time.
+        callback_executor: Optional CallbackExecutor, or a CallbackExecutor
+        mode or executor, to make the final callbacks with.  The final
+        callbacks are queued to a single thread by default so they don't
+        hold up the serial link, the oldest are dropped if the queue fills.
         """
-        self._arm_uart = ArmUART(port)
+        self.clock = clock or REAL_CLOCK
+        self.metrics = metrics or MetricsRegistry()
+        # Makes the user level final callbacks off the serial link threads.
+        if isinstance(callback_executor, CallbackExecutor):
+            self.callbacks = callback_executor
+        else:
+            self.callbacks = CallbackExecutor(callback_executor or 'queue',
+                                              metrics=self.metrics,
+                                              clock=self.clock)
+        self._other_resps = self.metrics.counter(
+            'lv5250_unexpected_responses_total',
+            'Responses other than the anticipated response by frame type.',
+            ('frame',))
+        self._limit_hits = self.metrics.counter(
+            'lv5250_limit_hits_total', 'Limit switch activations by axis.',
+            ('axis',))
+        if pool_size > 0:
+            self._msg_pool = ArmMessagePool(ArmMngrMessage, pool_size)
+        else:
+            self._msg_pool = None
         # Internal Arm Data Object
         self._arm_local = Arm()
 
-        # External Arm Data Object Queue
-        # The object is updated with the current arm state, position and
-        # commands as they are sent and received over the serial connection.
-        # Implemented as Last In First Out Queue so that the user gets the
-        # most recently updated version.
-        self.arm = queue.LifoQueue()
-
-    def arm_get(self, block=True, timeout=None) -> Arm:
+        # The most recently published Arm snapshot, waiters are notified
+        # through the condition when a new snapshot is published.
+        self._snapshot = ArmSnapshot()
+        self._snapshot_cond = self.clock.condition()
+
+        # External Arm Snapshot Queue
+        # An immutable snapshot of the current arm state, position and
+        # commands is published as they are sent and received over the serial
+        # connection.  Implemented as Last In First Out Queue so that the user
+        # gets the most recently updated version.
+        self.arm = self.clock.queue(queue.LifoQueue)
+
+        # Jog state for each axis, the jog thread is started on first use.
+        self._jog_axises = {}
+        self._jog_cond = self.clock.condition()
+        self._jog_thread = None
+        # Is a jog command waiting to be sent or completed?
+        self._jog_pending = False
+        # The time the last jog command was queued.
+        self._jog_tx_time = 0.0
+
+        # Functions to call after each position or status sample.
+        self._sample_cbs = []
+        # Optional position poll interval during the RUN moves so the sample
+        # callbacks, such as the ArmGuard, see the Arm while it moves
+        # (seconds)
+        self.move_poll_interval = None
+        # The most recent limit switch bits.
+        self._limits = 0
+        # The most recent decoded status and the functions to call when
+        # its fields change.
+        self._status = None
+        self._status_cbs = []
+
+        # Optional shared memory publisher.
+        self.shm = None
+        if shm_name is not None:
+            # Imported here so shared memory support is only loaded if used.
+            from lv5250.arm_shm import ArmShmPublisher
+            self.shm = ArmShmPublisher(shm_name)
+            self.sample_cb_add(self._shm_publish_cb)
+
+        # Has the Arm been Hard Homed, or its saved calibration verified,
+        # during this session?
+        self._homed = False
+        # Optional persisted calibration state.
+        self._calibration_path = calibration_path
+        self._fingerprint = calibration_fingerprint(port)
+        self.calibration = None
+        # The time of the last calibration save while homed.
+        self._calibration_time = None
+        self._calibration_writer = None
+        if calibration_path is not None:
+            self.calibration = ArmCalibration.load(calibration_path)
+            self._calibration_writer = CalibrationWriter(calibration_path,
+                                                         self.clock)
+            self.sample_cb_add(self._calibration_sample_cb)
+
+        # The serial link is created last as its state callback uses the
+        # Arm data above.
+        self._arm_uart = ArmUART(port, budgets=budgets, metrics=self.metrics,
+                                 state_cb=self._link_state_cb,
+                                 clock=self.clock)
+
+    def arm_get(self, block=True, timeout=None) -> ArmSnapshot:
         """
-        Returns the Current Arm Object
+        Returns the Arm Snapshot published since the last call
 
         Parameters:
-        block: Should the function wait for an Arm Object to available or
-        return immediately if no object is available?
+        block: Should the function wait for an Arm Snapshot to available or
+        return immediately if no snapshot is available?
 
-        timeout: Maximuim time to wait for the Arm Object (seconds)
+        timeout: Maximuim time to wait for the Arm Snapshot (seconds)
 
         Returns:
-        The most recently updated Arm Object or None if one is not available.
+        The most recently published Arm Snapshot or None if one is not
+        available.
         """
         try:
             # Remove the latest version of the arm object from the queue
@@ -114,36 +297,258 @@ class ArmManager:
         except queue.Empty:
             return None
 
-    def get_pos_cmd(self, cb=None) -> None:
+    def snapshot_get(self) -> ArmSnapshot:
+        """
+        Returns the most recently published Arm Snapshot without waiting.
+        """
+        return self._snapshot
+
+    @property
+    def homed(self) -> bool:
+        """
+        Has the Arm been Hard Homed, or its saved calibration verified,
+        during this session?
+        """
+        return self._homed
+
+    def calibration_save(self) -> None:
+        """
+        Save the calibration state now, for example before the application
+        exits, and wait for it to be written.  Does nothing if no
+        calibration path was set.
+        """
+        if self._calibration_writer is None:
+            return
+        self._calibration_submit()
+        self._calibration_writer.flush()
+
+    def _calibration_submit(self):
+        """
+        Hand the current calibration state to the background writer.
+        """
+        if self._calibration_writer is None:
+            return
+        snapshot = self._snapshot
+        calibration = ArmCalibration(self._fingerprint,
+                                     self._homed,
+                                     snapshot.command,
+                                     snapshot.position,
+                                     snapshot.limits)
+        calibration.saved = self.clock.time()
+        self.calibration = calibration
+        self._calibration_time = self.clock.monotonic()
+        self._calibration_writer.submit(calibration)
+
+    def _homed_clear(self):
+        """
+        The Arm is no longer homed, such as after a limit switch trip or an
+        E-Stop, so the saved calibration mustn't be trusted.
+        """
+        if self._homed:
+            self._homed = False
+            self._calibration_submit()
+
+    def _calibration_sample_cb(self, snapshot: ArmSnapshot):
+        """
+        Sample Callback which periodically saves the calibration state while
+        the Arm is homed.
+        """
+        if not self._homed:
+            return
+        calibration = self.calibration
+        if calibration is not None:
+            if (self._calibration_time is not None and self.clock.monotonic()
+                    - self._calibration_time < self.CALIBRATION_SAVE_INTERVAL):
+                return
+            if (calibration.homed and calibration.fingerprint == self._fingerprint
+                    and calibration.position == snapshot.position
+                    and calibration.command == snapshot.command
+                    and calibration.limits == snapshot.limits):
+                # Nothing has changed since the last save.
+                return
+        self._calibration_submit()
+
+    def wait_until(self,
+                   predicate: Callable[[ArmSnapshot], bool],
+                   timeout: float = None,
+                   poll_interval: float = 0.1) -> ArmSnapshot:
+        """
+        Wait until a predicate is true for the current Arm Snapshot.
+
+        The waiting thread is woken as soon as each new snapshot is
+        published so it returns within one sample of the condition becoming
+        true.  While waiting the position, or the status for predicates
+        with a poll_cmd of 'get_status_cmd', is polled so samples arrive
+        even if nothing else is requesting them.  Must not be called from an
+        ArmManager callback since the callbacks are made on the serial
+        thread or the callback executor.
+
+        Parameters:
+        predicate: Function of the form predicate(snapshot : ArmSnapshot)
+        -> bool, such as the predicates in arm_wait.
+        timeout: The maximuim time to wait (seconds), None waits forever.
+        poll_interval: The minimuim time between polls (seconds), None or 0
+        disables polling.
+
+        Returns:
+        The snapshot the predicate was true for or None on timeout.
+        """
+        clock = self.clock
+        if isinstance(predicate, WaitPredicate):
+            predicate.clock = clock
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        poll = None
+        if poll_interval:
+            poll = getattr(self, getattr(predicate, 'poll_cmd', 'get_pos_cmd'))
+        polling = [False]
+        last_poll = 0.0
+
+        def poll_cb(snapshot):
+            polling[0] = False
+
+        while True:
+            with self._snapshot_cond:
+                snapshot = self._snapshot
+                if predicate(snapshot):
+                    return snapshot
+                now = clock.monotonic()
+                if deadline is not None and now >= deadline:
+                    return None
+                if poll is None or polling[0] or now - last_poll < poll_interval:
+                    wait = poll_interval or None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._snapshot_cond.wait(wait)
+                    continue
+                polling[0] = True
+                last_poll = now
+            # Queue the poll outside the lock, the polls aren't printed.
+            poll(poll_cb, quiet=True)
+
+    @property
+    def transport(self) -> Transport:
+        """
+        Get the transport used to communicate with the Arm.
+        """
+        return self._arm_uart.transport
+
+    def link_stats(self) -> dict:
+        """
+        Returns the serial link utilisation statistics.
+        """
+        return self._arm_uart.link_stats()
+
+    def metrics_serve(self, port: int = 9250, host: str = '127.0.0.1'):
+        """
+        Serve the metrics over HTTP in the Prometheus text format.
+
+        Parameters:
+        port: The TCP port, 0 selects a free port.
+        host: The address to listen on, local only by default.
+
+        Returns the HTTP server, call shutdown() on it to stop serving.
+        """
+        return metrics_serve(self.metrics, port, host)
+
+    def sample_cb_add(self, cb) -> None:
+        """
+        Add a function to call after each position or status sample has been
+        parsed.  The function is called on the serial thread so it must
+        return quickly.
+
+        Parameters:
+        cb: Function of the form callback(snapshot : ArmSnapshot)
+        """
+        self._sample_cbs.append(cb)
+
+    def sample_cb_remove(self, cb) -> None:
+        """
+        Remove a sample function added by sample_cb_add().
+        """
+        if cb in self._sample_cbs:
+            self._sample_cbs.remove(cb)
+
+    def status_get(self) -> ArmStatus:
+        """
+        Returns the most recently received Arm Status or None if no status
+        has been received.
+        """
+        return self._status
+
+    def status_cb_add(self, cb, fields=None) -> None:
+        """
+        Add a function to call when a status field changes.  The function
+        is called once for each changed field, a status which is the same as
+        the previous status makes no calls.  Every field is reported as
+        changed for the first status.  The function is called on the serial
+        thread so it must return quickly.
+
+        Parameters:
+        cb: Function of the form callback(field : str, value, status :
+        ArmStatus)
+        fields: Optional ArmStatus field names to limit the calls to.
+        """
+        self._status_cbs.append((cb, frozenset(fields) if fields else None))
+
+    def status_cb_remove(self, cb) -> None:
+        """
+        Remove a status function added by status_cb_add().
+        """
+        self._status_cbs = [entry for entry in self._status_cbs
+                            if entry[0] != cb]
+
+    def _status_notify(self, status: ArmStatus, changed: tuple):
+        for cb, fields in self._status_cbs:
+            for name in changed:
+                if fields is None or name in fields:
+                    cb(name, getattr(status, name), status)
+
+    def _sample_notify(self):
+        snapshot = self._snapshot
+        for cb in self._sample_cbs:
+            cb(snapshot)
+
+    def _shm_publish_cb(self, snapshot: ArmSnapshot):
+        """
+        Sample Callback which publishes the position to shared memory.
+        """
+        self.shm.publish(snapshot.position, snapshot.limits, self.clock.time())
+
+    def get_pos_cmd(self, cb=None, quiet: bool = False) -> None:
         """
         Add a Get Position Command to the TX Que.
 
         Parameters:
         cb: Function to be called once the Get Position command has
         been sent and a resp is received or the reques times out.
+        quiet: Don't print the resp, such as for polling.
         """
-        message = ArmMngrMessage(command='GET POS',
-                                 resp='P',
-                                 timeout=2,
-                                 cb_done=self._get_pos_cmd_end_cb,
-                                 cb_other=self._other_resp_cb,
-                                 cb_final=cb)
+        message = self._msg_acquire(command='GET POS',
+                                    resp='P',
+                                    timeout=2,
+                                    cb_done=self._get_pos_cmd_end_cb,
+                                    cb_other=self._other_resp_cb,
+                                    cb_final=cb,
+                                    quiet=quiet)
         self._arm_uart.tx_msg_enque(message)
 
-    def get_status_cmd(self, cb=None) -> None:
+    def get_status_cmd(self, cb=None, quiet: bool = False) -> None:
         """
         Add a Get Status Command to the TX Que.
 
         Parameters:
         cb: Function to be called once the Get Position command has
         been sent and a resp is received or the reques times out.
+        quiet: Don't print the resp, such as for polling.
         """
-        message = ArmMngrMessage(command='?',
-                                 resp='?',
-                                 timeout=2,
-                                 cb_done=self._cmd_done_cb,
-                                 cb_other=self._other_resp_cb,
-                                 cb_final=cb)
+        message = self._msg_acquire(command='?',
+                                    resp='?',
+                                    timeout=2,
+                                    cb_done=self._get_status_cmd_end_cb,
+                                    cb_other=self._other_resp_cb,
+                                    cb_final=cb,
+                                    quiet=quiet)
         self._arm_uart.tx_msg_enque(message)
 
     def clear_estop_cmd(self, cb=None) -> None:
@@ -166,7 +571,8 @@ class ArmManager:
                            speed: int,
                            axises: Axises,
                            cb=None,
-                           timeout: int = 30) -> None:
+                           timeout: int = 30,
+                           in_position: int = None) -> None:
         """
         Add a Move to an Absolute Position Command to the TX Que.
 
@@ -174,6 +580,9 @@ class ArmManager:
         speed: Arm speed,  1 to 99 %
         axises: The axises position to move to.
         cb: Function to be called once the move has been completed or times out.
+        timeout: The maximuim time to wait for the move to complete (seconds)
+        in_position: Optional in position tolerance (encoder counts), see
+        move_to_cmd().
         """
         # Create the move command string
         cmd_str = self._run_cmd_str(speed, axises)
@@ -185,12 +594,88 @@ class ArmManager:
                                  cb_other=self._other_resp_cb,
                                  cb_final=cb,
                                  axises=axises)
+        self._move_poll_set(message, in_position)
         self._arm_uart.tx_msg_enque(message)
 
-    def move_to_cmd(self, speed: int, gripper: int, wrist_roll: int, wrist_pitch: int, elbow: int, shoulder: int, base: int, cb=None) -> None:
+    def run_program_cmd(self,
+                        program: ArmProgram,
+                        cb=None,
+                        timeout: int = 30) -> None:
+        """
+        Add a Run Program Command to the TX Que.
+
+        Sends a RUN command for each program row in order.  The rows are read
+        from the program as they are sent so only a single program message is
+        queued at a time.  Other commands added to the TX Que while the
+        program is running are sent between the program moves.
+
+        Parameters:
+        program: The program to run.
+        cb: Function to be called once the last move has been completed or a
+        move times out.
+        timeout: The maximuim time to wait for each move to complete (seconds)
+        """
+        rows = iter(program)
+        message = ArmMngrMessage(command=None,
+                                 resp='>END',
+                                 timeout=int(timeout),
+                                 cb_start=self._program_cmd_start_cb,
+                                 cb_done=self._program_cmd_done_cb,
+                                 cb_other=self._other_resp_cb,
+                                 cb_final=cb,
+                                 program=rows)
+        self._move_poll_set(message)
+        message.program_row = next(rows, None)
+        if message.program_row is None:
+            # Empty program, nothing to send.
+            if callable(cb):
+                self.callbacks.submit(cb, self._snapshot)
+            return
+        self._arm_uart.tx_msg_enque(message)
+
+    def _program_cmd_start_cb(self, message: ArmMngrMessage) -> ArmMngrMessage:
+        """
+        Run Program Start Callback.
+
+        Updates the commanded position with the next program row and
+        generates the RUN command string.  The relative axis limits are
+        checked against the new Shoulder and Elbow positions.
+        """
+        row = message.program_row
+        command = self._arm_local.command
+        command.counts_set(row[:6])
+        speed = row[6]
+
+        message.command = self._run_cmd_str(speed, command)
+        self._arm_update()
+        return message
+
+    def _program_cmd_done_cb(self, message: ArmMngrMessage, resp: str):
+        """
+        Run Program Done Callback.
+
+        Re-queues the program message while rows remain.  The final callback
+        is made after the last row or if a move times out.
+        """
+        if resp is not None:
+            message.program_row = next(message.program, None)
+            if message.program_row is not None:
+                self._arm_uart.tx_msg_enque(message)
+                return
+        self._final_cb(message)
+
+    def move_to_cmd(self, speed: int, gripper: int, wrist_roll: int, wrist_pitch: int, elbow: int, shoulder: int, base: int, cb=None, in_position: int = None) -> None:
         """
         Add a Move to an Absolute Position Command to the TX Que.
 
+        By default the move completes when the Arm sends >END after the
+        axises have settled.  If an in position tolerance is set the
+        position is polled during the move and the move completes as soon
+        as every axis is within the tolerance of its target, the next
+        queued command is then sent while the Arm finishes the move and
+        its >END is dropped.  Approach moves can use a tolerance to save
+        the settling time, moves which need the final accuracy shouldn't.
+
         Parameters:
         speed: Arm speed,  1 to 99 %
         gripper: Gripper Axis position (encoder counts)
@@ -200,28 +685,13 @@ class ArmManager:
         shoulder: Shoulder Axis position (encoder counts)
         base: Base Axis position (encoder counts)
         cb: Function to be called once the move has been completed or times out.
+        in_position: Optional in position tolerance (encoder counts)
         """
 
         # Create an axises with the command position.
         axises = Axises()
-        axises.gripper.counts = gripper
-        axises.wrist_roll.counts = wrist_roll
-        axises.wrist_pitch.counts = wrist_pitch
-        axises.elbow.counts = elbow
-        axises.shoulder.counts = shoulder
-        axises.base.counts = base
-
-        # Create the move command string
-        cmd_str = self._run_cmd_str(speed, axises)
-        message = ArmMngrMessage(command=cmd_str,
-                                 resp='>END',
-                                 timeout=30,
-                                 cb_start=self._move_to_cmd_start_cb,
-                                 cb_done=self._cmd_done_cb,
-                                 cb_other=self._other_resp_cb,
-                                 cb_final=cb,
-                                 axises=axises)
-        self._arm_uart.tx_msg_enque(message)
+        axises.counts_set((gripper, wrist_roll, wrist_pitch, elbow, shoulder, base))
+        self.move_to_axises_cmd(speed, axises, cb=cb, in_position=in_position)
 
     def remote_cmd(self, cb=None) -> None:
         """
@@ -243,19 +713,35 @@ class ArmManager:
         """
         Add a Stop Command to the TX Que.
 
+        The Stop is sent in order with the queued motion commands, after the
+        moves queued before it and ahead of the moves queued after it.  Use
+        stop_now_cmd() to stop immediately and cancel the queued moves.
         """
-        message = ArmMngrMessage(command='STOP',
-                                 resp='>OK',
-                                 timeout=5,
-                                 cb_done=self._cmd_done_cb,
-                                 cb_other=self._other_resp_cb,
-                                 cb_final=cb)
+        message = self._msg_acquire(command='STOP',
+                                    resp='>OK',
+                                    timeout=5,
+                                    cb_done=self._cmd_done_cb,
+                                    cb_other=self._other_resp_cb,
+                                    cb_final=cb)
         self._arm_uart.tx_msg_enque(message)
 
+    def stop_now_cmd(self) -> bool:
+        """
+        Send a Stop Command immediately.
+
+        Unlike stop_cmd() the Stop isn't queued so it doesn't wait for a
+        motion command which is waiting for its response.  The interrupted
+        command and the queued motion commands are cancelled, their final
+        callbacks are made with the snapshot result set to
+        MsgResult.CANCELLED.  Returns False if the Stop couldn't be sent.
+        """
+        return self._arm_uart.tx_urgent('STOP')
+
     def gripper_close_cmd(self,
                           speed: int = 50,
                           timeout: int = 10,
-                          cb=None) -> None:
+                          cb=None,
+                          stall: bool = False) -> None:
         """
         Add a Close Gripper Command to the TX Que and sait for the >GRIP_CLOSED
         response which indicates the Gripper is fully closed or grasping an
@@ -265,6 +751,9 @@ class ArmManager:
         speed: Gripper speed (1 to 99%)
         timeout: The maximuim time to wait for the comamnd to complete (seconds)
         cb: Function to call once the command completes or it times out.
+        stall: Also complete the command once the Gripper stops moving, see
+        gripper_open_cmd(), for objects which stop the Gripper without a
+        >GRIP_CLOSED response.
         """
         speed = limit_check(speed, 1, 99)
         message = ArmMngrMessage(command=f'MOVE {speed} 0 -1',
@@ -274,18 +763,23 @@ class ArmManager:
                                  cb_done=self._cmd_done_cb,
                                  cb_other=self._other_resp_cb,
                                  cb_final=cb)
+        if stall:
+            message.cb_poll = self._gripper_stall_poll()
+            message.poll_interval = self.GRIPPER_POLL_INTERVAL
         self._arm_uart.tx_msg_enque(message)
 
     def gripper_open_cmd(self,
                          speed: int = 50,
                          timeout: int = 20,
                          cb=None) -> None:
-        #TODO this doesn't call back after the gripper is fully open
-        # since there's not a response indicating when the gripper is fully
-        # open
         """
         Add a Open Gripper Command to the TX Que.
 
+        The Arm doesn't respond when the Gripper is fully open so the
+        Gripper position is polled while it opens and the command completes
+        once the position has stayed within GRIPPER_STALL_TOLERANCE for
+        GRIPPER_STALL_DURATION.  The serial link is released as soon as the
+        stall is detected.
 
         Parameters:
         speed: Gripper speed (1 to 99%)
@@ -300,9 +794,60 @@ class ArmManager:
                                  timeout=int(timeout),
                                  cb_done=self._cmd_done_cb,
                                  cb_other=self._other_resp_cb,
-                                 cb_final=cb)
+                                 cb_final=cb,
+                                 cb_poll=self._gripper_stall_poll(),
+                                 poll_interval=self.GRIPPER_POLL_INTERVAL)
         self._arm_uart.tx_msg_enque(message)
 
+    def _move_poll_set(self, message: ArmMngrMessage, in_position: int = None):
+        """
+        Polls the position during a RUN move if there is an in position
+        tolerance or the move poll interval is set.
+        """
+        intervals = [interval for interval in (
+            self.move_poll_interval,
+            None if in_position is None else self.IN_POSITION_POLL_INTERVAL)
+            if interval]
+        if intervals:
+            message.cb_poll = self._move_poll(in_position)
+            message.poll_interval = min(intervals)
+
+    def _move_poll(self, tolerance: int = None):
+        """
+        Returns a poll callback which records each position response, which
+        makes the sample callbacks, and if there is a tolerance returns True
+        once every axis is within the tolerance of the move's target.
+        """
+        if tolerance is not None:
+            tolerance = abs(int(tolerance))
+
+        def poll_cb(message, resp):
+            self._handle_position(resp, quiet=True)
+            if tolerance is None:
+                return False
+            return all(abs(position - target) <= tolerance for position, target
+                       in zip(self._snapshot.position, message.axises.counts_get()))
+
+        return poll_cb
+
+    def _gripper_stall_poll(self):
+        """
+        Returns a poll callback which records each position response and
+        returns True once the Gripper has stalled.  Motion isn't required
+        so a Gripper which is already at the end of its travel completes
+        after GRIPPER_STALL_DURATION.
+        """
+        stalled = GripperStalled(self.GRIPPER_STALL_DURATION,
+                                 self.GRIPPER_STALL_TOLERANCE,
+                                 require_motion=False)
+        stalled.clock = self.clock
+
+        def poll_cb(message, resp):
+            self._handle_position(resp, quiet=True)
+            return stalled(self._snapshot)
+
+        return poll_cb
+
     def hard_home_cmd(self, cb=None) -> None:
         """
         Add a Hard Home Command to the TX Que.
@@ -319,11 +864,68 @@ class ArmManager:
         message = ArmMngrMessage(command='HARDHOME',
                                  resp='>END',
                                  timeout=30,
-                                 cb_done=self._cmd_done_cb,
+                                 cb_start=self._hard_home_start_cb,
+                                 cb_done=self._hard_home_done_cb,
                                  cb_other=self._other_resp_cb,
                                  cb_final=cb)
         self._arm_uart.tx_msg_enque(message)
 
+    def _hard_home_start_cb(self, message: ArmMngrMessage) -> ArmMngrMessage:
+        # The Arm isn't homed until the Hard Home completes.
+        self._homed_clear()
+        return message
+
+    def _hard_home_done_cb(self, message: ArmMngrMessage, resp: str):
+        """
+        Hard Home Done Callback
+
+        Marks the Arm as homed and saves the calibration if the Hard Home
+        completed.
+        """
+        if resp is not None:
+            self._homed = True
+            self._calibration_submit()
+        self._cmd_done_cb(message, resp)
+
+    def home_if_needed_cmd(self, cb=None) -> None:
+        """
+        Hard Home the Arm unless the saved calibration is still valid.
+
+        Requests the Arm status and compares the reported position and limit
+        switches with the saved calibration.  If they agree the Hard Home is
+        skipped and the saved command position is restored, otherwise a Hard
+        Home Command is added to the TX Que.
+
+        Parameters:
+        cb: Function to be called once the calibration is verified or the
+        Hard Home completes or times out.
+        """
+        # The calibration is checked on the serial thread, rather than by
+        # a final callback, since it updates the Arm state.
+        def status_done_cb(message: ArmMngrMessage, resp: str):
+            self._handle_status(resp)
+            snapshot = self._snapshot
+            calibration = self.calibration
+            if calibration is not None and calibration.verify(
+                    self._fingerprint, snapshot.position, snapshot.limits):
+                print('Calibration Verified, Skipping Hard Home')
+                self._homed = True
+                self._arm_local.command.counts_set(calibration.command)
+                self._arm_update()
+                self._cmd_done_cb(message, resp)
+            else:
+                print('Calibration Not Verified, Hard Homing')
+                self.hard_home_cmd(message.cb_final)
+                self._msg_release(message)
+
+        message = self._msg_acquire(command='?',
+                                    resp='?',
+                                    timeout=2,
+                                    cb_done=status_done_cb,
+                                    cb_other=self._other_resp_cb,
+                                    cb_final=cb)
+        self._arm_uart.tx_msg_enque(message)
+
     def free_cmd(self, cb=None) -> None:
         """
         Add a Free Command to the TX Que.
@@ -420,14 +1022,110 @@ class ArmManager:
 
         cmd_str = self._move_cmd_str(axis, speed)
         print(cmd_str)
-        # The final callback is made by the get position comand.
         msg = ArmMngrMessage(command=cmd_str,
                              resp='>OK',
                              timeout=int(timeout),
+                             cb_done=self._cmd_done_cb,
                              cb_other=self._other_resp_cb,
                              cb_final=cb)
         self._arm_uart.tx_msg_enque(msg)
 
+    def jog(self, axis: AxisType, velocity: float) -> None:
+        """
+        Jog an axis at a continuous velocity.
+
+        Intended to be called repeatedly with the current value of an input
+        such as a joystick axis.  The velocity is quantized to a MOVE command
+        speed and a new MOVE command is only sent when the quantized speed
+        changes, no more often than JOG_CMD_INTERVAL.  The Arm is stopped if
+        an axis is not updated within the JOG_DEADMAN window so jog must be
+        called periodically, even if the velocity has not changed, to keep
+        the axis moving.
+
+        Parameters:
+        axis: The axis to jog.
+        velocity: The axis velocity, -1.0 (full speed reverse) to
+        1.0 (full speed forward).  0 stops the axis.
+        """
+        axis = AxisType(axis)
+        velocity = max(-1.0, min(1.0, float(velocity)))
+        step = self.JOG_SPEED_STEP
+        speed = limit_check(round(velocity * 99 / step) * step, -99, 99)
+
+        with self._jog_cond:
+            jog_axis = self._jog_axises.get(axis)
+            if jog_axis is None:
+                jog_axis = JogAxis(axis)
+                self._jog_axises[axis] = jog_axis
+            jog_axis.speed = speed
+            jog_axis.updated = self.clock.monotonic()
+            if self._jog_thread is None:
+                self._jog_thread = self.clock.thread(self._jog_loop)
+                self._jog_thread.start()
+            self._jog_cond.notify()
+
+    def _jog_loop(self):
+        """
+        Jog Thread Loop
+
+        Sends the jog MOVE and STOP commands.  Only a single jog command is
+        queued at a time so the commands never lag behind the jog input.
+        """
+        with self._jog_cond:
+            while True:
+                now = self.clock.monotonic()
+                for jog_axis in self._jog_axises.values():
+                    if now - jog_axis.updated > self.JOG_DEADMAN:
+                        # Dead-man timeout, stop the axis.
+                        jog_axis.speed = 0
+
+                if not self._jog_pending \
+                        and now - self._jog_tx_time >= self.JOG_CMD_INTERVAL:
+                    self._jog_send()
+
+                self._jog_cond.wait(self.JOG_CMD_INTERVAL / 2)
+
+    def _jog_send(self):
+        """
+        Queue the next jog command if a jog axis speed has changed.
+
+        The MOVE command can't stop an individual axis so a STOP command is
+        sent when any axis is stopped.  Axises which are still moving are
+        restarted by the following MOVE commands.
+        """
+        stopped = [jog_axis for jog_axis in self._jog_axises.values()
+                   if jog_axis.speed == 0 and jog_axis.sent != 0]
+        if stopped:
+            for jog_axis in self._jog_axises.values():
+                jog_axis.sent = 0
+            cmd_str = 'STOP'
+        else:
+            for jog_axis in self._jog_axises.values():
+                if jog_axis.speed != jog_axis.sent:
+                    jog_axis.sent = jog_axis.speed
+                    cmd_str = self._move_cmd_str(jog_axis.axis, jog_axis.speed)
+                    break
+            else:
+                return
+
+        message = ArmMngrMessage(command=cmd_str,
+                                 resp='>OK',
+                                 timeout=1,
+                                 cb_done=self._jog_done_cb,
+                                 cb_other=self._other_resp_cb)
+        self._jog_pending = True
+        self._jog_tx_time = self.clock.monotonic()
+        self._arm_uart.tx_msg_enque(message)
+
+    def _jog_done_cb(self, message: ArmMngrMessage, resp: str):
+        """
+        Jog Command Done Callback.
+        Allows the next jog command to be sent.
+        """
+        with self._jog_cond:
+            self._jog_pending = False
+            self._jog_cond.notify()
+
     def _move_cmd_str(self, axis: AxisType, speed: int) -> str:
         """
         Create a Move Command Message String.
@@ -467,6 +1165,7 @@ class ArmManager:
                                  cb_other=self._other_resp_cb,
                                  cb_final=cb,
                                  inc_move=incremental)
+        self._move_poll_set(message)
         self._arm_uart.tx_msg_enque(message)
 
     def _move_inc_cmd_start_cb(self, message: ArmMngrMessage) -> ArmMngrMessage:
@@ -491,27 +1190,66 @@ class ArmManager:
             self._arm_local.command.base.counts += message.inc_move.counts
 
         # Generate the command string
-        message.command = self._run_cmd_str(
+        cmd_str = self._run_cmd_str(
             message.inc_move.speed, self._arm_local.command)
-        print('Incremental Move Msg: {}'.format(message.command))
-        self._arm_update(self._arm_local)
+        message.command = cmd_str
+        print('Incremental Move Msg: {}'.format(cmd_str))
+        self._arm_update()
         return message
 
-    def _arm_update(self, arm: Arm):
+    def _msg_acquire(self, **kwargs) -> ArmMngrMessage:
         """
-        Update the shared Arm Object
+        Returns a message from the message pool or a new message if pooling
+        is disabled.
+        """
+        if self._msg_pool is not None:
+            return self._msg_pool.acquire(**kwargs)
+        return ArmMngrMessage(**kwargs)
 
-        Parameters:
-        arm: The updated Arm object
+    def _msg_release(self, message: ArmMngrMessage):
+        """
+        Return a message to the pool it was acquired from.
         """
-        if arm:
-            try:
-                # Add object into the shared queue
-                self.arm.put_nowait(arm)
-            except queue.Full:
-                # clear the queue if it's full and try again.
-                self.arm.queue.clear()
-                self._arm_update(arm)
+        if message.pool is not None:
+            message.pool.release(message)
+
+    def _arm_update(self):
+        """
+        Publish a snapshot of the local Arm Object
+
+        The unchanged parts of the previous snapshot are reused.
+        """
+        snapshot = ArmSnapshot.from_arm(
+            self._arm_local, self._limits, self._snapshot)
+        with self._snapshot_cond:
+            self._snapshot = snapshot
+            self._snapshot_cond.notify_all()
+        try:
+            # Add the snapshot into the shared queue
+            self.arm.put_nowait(snapshot)
+        except queue.Full:
+            # clear the queue if it's full and try again.
+            self.arm.queue.clear()
+            self.arm.put_nowait(snapshot)
+
+    def _link_state_cb(self, state: ArmConnectionState):
+        """
+        Serial Link Connection State Callback
+
+        Publishes the new connection state.  When the link connects the
+        Arm's status is read to resync the position and limit switches, the
+        link has already put the Arm back into remote mode.  The status is
+        sent ahead of the queued messages.
+        """
+        self._arm_local.state = state
+        self._arm_update()
+        if state == ArmConnectionState.CONNECTED:
+            message = self._msg_acquire(command='?',
+                                        resp='?',
+                                        timeout=2,
+                                        cb_done=self._get_status_cmd_end_cb,
+                                        cb_other=self._other_resp_cb)
+            self._arm_uart.tx_msg(message)
 
     # Function for handling a Get Position End resp
 
@@ -522,27 +1260,51 @@ class ArmManager:
         Updates the local Arm object and makes the final callback.
 
         """
-        print('Position resp: {}'.format(resp))
-        self._handle_position(resp)
+        if not message.quiet:
+            print('Position resp: {}'.format(resp))
+        self._handle_position(resp, message.quiet)
         # Make the final callback.
-        if callable(message.cb_final):
-            message.cb_final(self._arm_local)
+        self._final_cb(message)
+        self._msg_release(message)
+
+    def _get_status_cmd_end_cb(self, message: ArmMngrMessage, resp: str):
+        """
+        Get Status Command End Callback
+
+        Updates the local Arm object from the status and makes the final
+        callback.
+        """
+        self._handle_status(resp)
+        self._final_cb(message)
+        self._msg_release(message)
 
     # Function called at the start of a Run Command
     def _move_to_cmd_start_cb(self, message: ArmMngrMessage) -> ArmMngrMessage:
         # Update in the Arm Object with the new command.
         self._arm_local.command = message.axises
-        self._arm_update(self._arm_local)
+        self._arm_update()
         return message
 
+    def _final_cb(self, message: ArmMngrMessage):
+        """
+        Make a message's user level final callback, if set, with the current
+        snapshot on the callback executor.  The snapshot's result is set if
+        the message timed out or was cancelled.
+        """
+        if callable(message.cb_final):
+            snapshot = self._snapshot
+            if message.result not in (None, MsgResult.COMPLETED):
+                snapshot = snapshot._replace(result=message.result)
+            self.callbacks.submit(message.cb_final, snapshot)
+
     def _cmd_done_cb(self, message: ArmMngrMessage, resp: str):
         """
         Shared Message Done Callback for messages which don't require any
         special completition work.  Makes the user level final callback
         if set.
         """
-        if callable(message.cb_final):
-            message.cb_final(self._arm_local)
+        self._final_cb(message)
+        self._msg_release(message)
 
     # Generic Function for handling a Other (Unexcepted) resps
     def _other_resp_cb(self, message: ArmMngrMessage, resp: str):
@@ -551,6 +1313,9 @@ class ArmManager:
             str_arr = resp.split()
             if len(str_arr) > 0:
                 command = str_arr[0]
+                # Unknown frames share a label to bound the label values.
+                self._other_resps.inc(
+                    command if command in self.FRAME_TYPES else 'unknown')
                 # Attempt to Detect the resp Type
                 if command == 'P':  # Position resp
                     self._handle_position(resp)
@@ -560,6 +1325,7 @@ class ArmManager:
                     print(f'Error resp: {resp}')
                 elif command == 'ESTOP':
                     print(f'E-Stop resp: {resp}')
+                    self._homed_clear()
                 elif command == '>LIMIT':
                     print(f'Unexpected Limit resps: {resp}')
                 elif command == 'GRIP_OBJECT':
@@ -574,12 +1340,16 @@ class ArmManager:
                 else:
                     print(f'Unhandled resp: {resp}')
 
-    def _handle_position(self, resp: str):
+    def _handle_position(self, resp: str, quiet: bool = False):
         """
         Handle Position resps
 
         Position resps start with a P and contain each of the current Arm
         Axis encoder positions.
+
+        Parameters:
+        resp: The Position resp.
+        quiet: Don't print the resp, such as for the position polls.
         """
         if resp:
             str_arr = resp.split()
@@ -590,8 +1360,10 @@ class ArmManager:
                 self._arm_local.position.elbow.counts = int(str_arr[4])
                 self._arm_local.position.shoulder.counts = int(str_arr[5])
                 self._arm_local.position.base.counts = int(str_arr[6])
-                self._arm_update(self._arm_local)
-                print(resp)
+                self._arm_update()
+                self._sample_notify()
+                if not quiet:
+                    print(resp)
                 # TODO:  handle the last two fields but we don't know their meaning
 
     def _handle_status(self, resp: str):
@@ -601,23 +1373,45 @@ class ArmManager:
         Status resps start with a ? and contain all Arm state information.
         """
         if resp:
-            str_arr = resp.split()
-            if len(str_arr) == 23 and str_arr[0] == '?':
-                # TODO:  handle the other fields
-                self._limit_decode(int(str_arr[8]))
-
-                self._arm_local.position.gripper.counts = int(str_arr[10])
-                self._arm_local.position.wrist_roll.counts = int(str_arr[11])
-                self._arm_local.position.wrist_pitch.counts = int(str_arr[12])
-                self._arm_local.position.elbow.counts = int(str_arr[13])
-                self._arm_local.position.shoulder.counts = int(str_arr[14])
-                self._arm_local.position.base.counts = int(str_arr[15])
-                self._arm_update(self._arm_local)
-                #print(resp)
-            else:
+            status = ArmStatus.parse(resp)
+            if status is None:
                 print('Unhandled Status: {}'.format(resp))
+                return
+            previous = self._status
+            changed = status.changed(previous)
+            self._status = status
+            if status.estop and (previous is None or not previous.estop):
+                # The Arm may have been moved while the E-Stop was active.
+                self._homed_clear()
+            update = bool(changed)
+            if changed:
+                # Only the changed fields are applied.
+                if status.limits != self._limits:
+                    self._limit_decode(status.limits)
+                    self._limits = status.limits
+            # The position is compared with the published position for every
+            # status, even an unchanged one, as it's also updated by the
+            # position responses.
+            position = status.position
+            if position != self._snapshot.position:
+                self._arm_local.position.counts_set(position)
+                update = True
+            if update:
+                self._arm_update()
+            if changed:
+                self._status_notify(status, changed)
+            self._sample_notify()
+            #print(resp)
 
     def _limit_decode(self, limit: int):
+        # Count the switches which have activated since the last status.
+        hits = limit & ~self._limits
+        if hits:
+            # A limit trip means the Arm isn't where it was commanded.
+            self._homed_clear()
+            for axis in AxisType:
+                if hits & (1 << axis.value):
+                    self._limit_hits.inc(axis.name.lower())
         if limit != 0:
             #print('Limit Sw: {}'.format(limit))
             if limit & (1 << AxisType.BASE.value):
@@ -679,22 +1473,24 @@ class ArmManager:
                                  timeout=30,
                                  cb_done=self._cmd_done_cb,
                                  cb_other=self._other_resp_cb)
+        self._move_poll_set(message)
         self._arm_uart.tx_msg_enque(message)
 
 
 def done_print_cb(arm):
+    position = arm.position.axises()
     print(
-        f'Gripper: {arm.position.gripper.counts} cnts / {arm.position.gripper.mm:.2f} mm')
+        f'Gripper: {position.gripper.counts} cnts / {position.gripper.mm:.2f} mm')
     print(
-        f'Wrist Roll: {arm.position.wrist_roll.counts} cnts / {arm.position.wrist_roll.angle:.1f} deg')
+        f'Wrist Roll: {position.wrist_roll.counts} cnts / {position.wrist_roll.angle:.1f} deg')
     print(
-        f'Wrist Pitch: {arm.position.wrist_pitch.counts} cnts / {arm.position.wrist_pitch.angle:.1f} deg')
+        f'Wrist Pitch: {position.wrist_pitch.counts} cnts / {position.wrist_pitch.angle:.1f} deg')
     print(
-        f'Elbow: {arm.position.elbow.counts} cnts / {arm.position.elbow.angle:.1f} deg')
+        f'Elbow: {position.elbow.counts} cnts / {position.elbow.angle:.1f} deg')
     print(
-        f'Shoulder: {arm.position.shoulder.counts} cnts / {arm.position.shoulder.angle:.1f} deg')
+        f'Shoulder: {position.shoulder.counts} cnts / {position.shoulder.angle:.1f} deg')
     print(
-        f'Base: {arm.position.base.counts} cnts / {arm.position.base.angle:.1f} deg')
+        f'Base: {position.base.counts} cnts / {position.base.angle:.1f} deg')
 
 
 def gripper_close_cb(arm):
@@ -716,14 +1512,20 @@ if __name__ == "__main__":
     manager.clear_estop_cmd()
     manager.stop_cmd()
 
-    for i in range(10):
-        manager.move_axis_cmd(axis=AxisType.ELBOW, speed=20)
-        time.sleep(1)
-        manager.stop_cmd()
-
-        manager.move_axis_cmd(axis=AxisType.ELBOW, speed=-20)
-        time.sleep(1)
-        manager.stop_cmd()
+    # Move the Elbow back and forth by about 2000 counts.
+    start = manager.wait_until(PositionStable(200), timeout=5)
+    if start is not None:
+        elbow = start.position.elbow
+        for i in range(10):
+            manager.move_axis_cmd(axis=AxisType.ELBOW, speed=20)
+            manager.wait_until(lambda arm: arm.position.elbow >= elbow + 2000,
+                               timeout=5)
+            manager.stop_cmd()
+
+            manager.move_axis_cmd(axis=AxisType.ELBOW, speed=-20)
+            manager.wait_until(lambda arm: arm.position.elbow <= elbow,
+                               timeout=5)
+            manager.stop_cmd()
 
     #manager.hard_home_cmd()
 
@@ -773,6 +1575,6 @@ if __name__ == "__main__":
     #arm.move_to_limit_cmd(AxisType.SHOULDER, -10, print_abs_cb)
     #arm.get_pos_cmd(print_abs_cb)
 
-    time.sleep(120)
-
-    time.sleep(120)
+    # Wait for the Arm to come to rest.
+    done_print_cb(manager.wait_until(PositionStable(500), timeout=30)
+                  or manager.snapshot_get())
@@ -0,0 +1,341 @@
+import bisect
+import threading
+
+from lv5250 import *
+
+
+class _Cells:
+    """
+    Per Thread Metric Cells
+
+    Each thread records into its own cells so the hot path never takes a
+    lock: a thread only ever writes to cells it created and the readers sum
+    the cells of every thread.  The cell dictionaries are only added to,
+    never removed, so a thread's counts survive the thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+
+    def cell(self, key: tuple, size: int) -> list:
+        try:
+            cells = self._local.cells
+        except AttributeError:
+            cells = self._local.cells = {}
+            self._all.append(cells)
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0] * size
+        return cell
+
+    def totals(self) -> dict:
+        """
+        Returns a dictionary of the label values to the summed cells.
+        """
+        totals = {}
+        for cells in list(self._all):
+            for key, cell in cells.copy().items():
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = list(cell)
+                else:
+                    for index, value in enumerate(cell):
+                        total[index] += value
+        return totals
+
+
+def _labels_str(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = ['{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                              .replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+def _value_str(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """
+    Monotonic Counter Metric
+
+    Parameters:
+    name: The metric name.
+    help: The metric description.
+    labels: The label names, the values are passed to inc() in the same
+    order.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name: str, help: str = '', labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._cells = _Cells()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """
+        Increment the counter for the label values.
+        """
+        self._cells.cell(labels, 1)[0] += amount
+
+    def value(self, *labels) -> float:
+        """
+        Returns the current total for the label values.
+        """
+        return self._cells.totals().get(labels, [0])[0]
+
+    def samples(self) -> list:
+        return [(self.name, _labels_str(self.labels, key), cell[0])
+                for key, cell in sorted(self._cells.totals().items())]
+
+
+class Gauge:
+    """
+    Gauge Metric
+
+    The value is either set by the application or read from a function
+    when the metrics are collected.
+
+    Parameters:
+    name: The metric name.
+    help: The metric description.
+    labels: The label names.
+    func: Optional function returning the value, or a dictionary of label
+    value tuples to values, at collection time.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str = '', labels: tuple = (), func=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.func = func
+        # A single dictionary store is atomic so no lock is needed.
+        self._values = {}
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def value(self, *labels) -> float:
+        return self._collect().get(labels, 0)
+
+    def _collect(self) -> dict:
+        if callable(self.func):
+            value = self.func()
+            if isinstance(value, dict):
+                return value
+            return {(): value}
+        return self._values.copy()
+
+    def samples(self) -> list:
+        return [(self.name, _labels_str(self.labels, key), value)
+                for key, value in sorted(self._collect().items())]
+
+
+class Histogram:
+    """
+    Histogram Metric
+
+    Parameters:
+    name: The metric name.
+    help: The metric description.
+    buckets: The bucket upper bounds in increasing order.
+    labels: The label names.
+    """
+
+    type = 'histogram'
+
+    # Default buckets for link round trip times (seconds)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name: str, help: str = '', buckets: tuple = None,
+                 labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets or self.BUCKETS))
+        self._cells = _Cells()
+
+    def observe(self, value: float, *labels) -> None:
+        """
+        Record a value for the label values.
+        """
+        # Cell layout: per bucket counts, the +Inf count and the sum.
+        cell = self._cells.cell(labels, len(self.buckets) + 2)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def samples(self) -> list:
+        samples = []
+        for key, cell in sorted(self._cells.totals().items()):
+            count = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), cell):
+                count += bucket
+                samples.append((self.name + '_bucket',
+                                _labels_str(self.labels, key,
+                                            'le="{}"'.format(_value_str(bound))),
+                                count))
+            labels = _labels_str(self.labels, key)
+            samples.append((self.name + '_sum', labels, cell[-1]))
+            samples.append((self.name + '_count', labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Metrics Registry
+
+    Holds the metrics and renders them in the Prometheus text exposition
+    format.  The counter(), gauge() and histogram() functions return the
+    existing metric if one with the same name is already registered.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_type, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_type(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str = '', labels: tuple = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = '', labels: tuple = (), func=None) -> Gauge:
+        return self._get(Gauge, name, help, labels, func)
+
+    def histogram(self, name: str, help: str = '', buckets: tuple = None,
+                  labels: tuple = ()) -> Histogram:
+        return self._get(Histogram, name, help, buckets, labels)
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if metric.help:
+                lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(name, labels, _value_str(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class LinkMetrics:
+    """
+    Serial Link Metrics
+
+    The metrics recorded by the serial link.
+
+    Parameters:
+    registry: The registry to add the metrics to.
+    messages: The link scheduler, used for the queue depth and the link
+    rates.
+    """
+
+    def __init__(self, registry: MetricsRegistry, messages):
+        self.registry = registry
+        self.sent = registry.counter(
+            'lv5250_commands_sent_total', 'Commands sent by type.', ('command',))
+        self.timeouts = registry.counter(
+            'lv5250_command_timeouts_total',
+            'Commands without the anticipated response by type.', ('command',))
+        self.latency = registry.histogram(
+            'lv5250_command_latency_seconds',
+            'Command round trip time by type.', labels=('command',))
+        self.tx_bytes = registry.counter(
+            'lv5250_link_tx_bytes_total', 'Bytes sent to the Arm.')
+        self.rx_bytes = registry.counter(
+            'lv5250_link_rx_bytes_total', 'Bytes received from the Arm.')
+        self.connected = registry.gauge(
+            'lv5250_link_connected', '1 while the link is connected.')
+        self.disconnects = registry.counter(
+            'lv5250_link_disconnects_total', 'Link losses.')
+        self.reconnect = registry.histogram(
+            'lv5250_link_reconnect_seconds',
+            'Time to reopen the link and probe the Arm after a loss.')
+        self.outage = registry.histogram(
+            'lv5250_link_outage_seconds',
+            'Time from a link loss until the link is connected again.')
+        registry.gauge(
+            'lv5250_queue_depth', 'Messages waiting to be sent.',
+            func=messages.qsize)
+        registry.gauge(
+            'lv5250_link_bytes_per_second',
+            'Recent link throughput by direction.', ('direction',),
+            func=lambda: self._rates(messages))
+
+    @staticmethod
+    def _rates(messages) -> dict:
+        stats = messages.stats()
+        return {('tx',): stats['tx_rate'], ('rx',): stats['rx_rate']}
+
+
+def command_type(command: bytes) -> str:
+    """
+    Returns the command type, the command name without its arguments,
+    for example 'RUN' or 'GET POS'.
+    """
+    words = command.split(None, 2)
+    if not words:
+        return ''
+    if words[0] in (b'GET', b'SET') and len(words) > 1:
+        return (words[0] + b' ' + words[1]).decode('ascii', 'replace')
+    return words[0].decode('ascii', 'replace')
+
+
+def metrics_serve(registry: MetricsRegistry, port: int = 9250,
+                  host: str = '127.0.0.1'):
+    """
+    Serve the metrics over HTTP on a background thread for scraping.
+
+    Parameters:
+    registry: The registry to serve.
+    port: The TCP port, 0 selects a free port.
+    host: The address to listen on, local only by default.
+
+    Returns the HTTP server, call shutdown() on it to stop serving.
+    """
+    # Imported here so http.server is only loaded if the endpoint is used.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,253 @@
+import collections
+import tkinter
+from tkinter import *
+
+from lv5250 import *
+from lv5250.axis import *
+from lv5250.axises import *
+from lv5250.arm_snapshot import *
+
+
+# Axis attribute names in AxisType order.
+_AXIS_NAMES = ('gripper', 'wrist_roll', 'wrist_pitch', 'elbow', 'shoulder',
+               'base')
+
+
+def history_columns(samples, index: int, end: float, span: float,
+                    width: int, height: int, low: float, high: float) -> list:
+    """
+    Downsample the history of an axis to the pixel columns of a plot.  Each
+    column is reduced to its minimuim and maximuim so the plot keeps the
+    peaks however many samples fall in a column.  Returns the flattened
+    line coordinates.
+
+    Parameters:
+    samples: The (time, AxisCounts) samples in time order.
+    index: The axis index in the counts.
+    end: The time at the right edge of the plot (seconds)
+    span: The time across the plot (seconds)
+    width / height: The plot size (pixels)
+    low / high: The counts at the bottom and top of the plot.
+    """
+    start = end - span
+    scale_x = (width - 1) / span
+    scale_y = (height - 1) / ((high - low) or 1)
+    coords = []
+    column = None
+    for sample_time, position in samples:
+        if sample_time < start:
+            continue
+        x = int((sample_time - start) * scale_x)
+        value = position[index]
+        if x != column:
+            if column is not None:
+                _column_add(coords, column, column_min, column_max,
+                            height, low, scale_y)
+            column = x
+            column_min = column_max = value
+        elif value < column_min:
+            column_min = value
+        elif value > column_max:
+            column_max = value
+    if column is not None:
+        _column_add(coords, column, column_min, column_max, height, low, scale_y)
+    return coords
+
+
+def _column_add(coords, x, value_min, value_max, height, low, scale_y):
+    y_min = height - 1 - (value_min - low) * scale_y
+    coords += (x, y_min)
+    if value_max != value_min:
+        coords += (x, height - 1 - (value_max - low) * scale_y)
+
+
+class ArmMonitor(Frame):
+    """
+    Live Arm Monitor
+
+    A tkinter window showing the commanded and measured position of each
+    axis in encoder counts and degrees (mm for the Gripper), the limit
+    switch bits, the link statistics and a short history plot of each axis.
+
+    The display is refreshed by an after() timer at FPS frames per second
+    from the manager's most recent snapshot, only the widgets whose values
+    changed are updated.  The position samples for the plots are appended
+    to a bounded deque by a sample callback, which is all the work done on
+    the serial thread, and are downsampled to the plot width when drawn so
+    the redraw cost doesn't depend on the telemetry rate.
+
+    Parameters:
+    manager: The ArmManager to monitor.
+    master: Optional parent widget, a new Tk window is created if not set.
+    fps: The display refresh rate (frames per second)
+    history: The time shown by the history plots (seconds)
+    """
+
+    # Display refresh rate (frames per second)
+    FPS = 20
+
+    # Time shown by the history plots (seconds)
+    HISTORY = 10.0
+
+    # Maximuim number of samples kept for the history plots.
+    HISTORY_SAMPLES = 4096
+
+    # History plot size (pixels)
+    PLOT_WIDTH = 240
+    PLOT_HEIGHT = 36
+
+    # Minimuim time between link statistics updates (seconds)
+    STATS_INTERVAL = 1.0
+
+    def __init__(self, manager, master=None, fps: float = FPS,
+                 history: float = HISTORY):
+        if master is None:
+            master = Tk()
+            master.title("LV5250 Arm Monitor")
+        super().__init__(master)
+        self.manager = manager
+        self.interval = max(1, int(1000 / fps))
+        self.history = float(history)
+        self._samples = collections.deque(maxlen=self.HISTORY_SAMPLES)
+        # The samples drawn by the most recent frame.
+        self._drawn = None
+        self._snapshot = None
+        self._stats_time = 0.0
+        # The text currently displayed by each label.
+        self._texts = {}
+        self._timer = None
+        self._build()
+        self.pack(fill=BOTH, expand=True)
+        manager.sample_cb_add(self._sample_cb)
+        self.bind('<Destroy>', self._destroy_cb)
+        self.start()
+
+    def _build(self):
+        headings = ('Axis', 'Command', 'Position', 'Command deg', 'Position deg',
+                    'Limit', 'History')
+        for column, heading in enumerate(headings):
+            Label(self, text=heading, font='TkDefaultFont 9 bold').grid(
+                row=0, column=column, padx=4, sticky=W)
+        self._cells = []
+        self._plots = []
+        for index, name in enumerate(_AXIS_NAMES):
+            row = index + 1
+            Label(self, text=name.replace('_', ' ').title()).grid(
+                row=row, column=0, padx=4, sticky=W)
+            cells = []
+            for column in range(1, 6):
+                label = Label(self, width=10, anchor=E)
+                label.grid(row=row, column=column, padx=4)
+                cells.append(label)
+            self._cells.append(cells)
+            canvas = Canvas(self, width=self.PLOT_WIDTH, height=self.PLOT_HEIGHT,
+                            background='white', highlightthickness=0)
+            canvas.grid(row=row, column=6, padx=4, pady=2)
+            command = canvas.create_line(0, 0, 0, 0, fill='grey', dash=(2, 2))
+            position = canvas.create_line(0, 0, 0, 0, fill='blue')
+            self._plots.append((canvas, position, command))
+        self._state = Label(self, anchor=W)
+        self._state.grid(row=7, column=0, columnspan=3, padx=4, sticky=W)
+        self._stats = Label(self, anchor=W)
+        self._stats.grid(row=7, column=3, columnspan=4, padx=4, sticky=W)
+
+    def start(self) -> None:
+        """
+        Start refreshing the display.
+        """
+        if self._timer is None:
+            self._timer = self.after(self.interval, self._frame)
+
+    def stop(self) -> None:
+        """
+        Stop refreshing the display.
+        """
+        if self._timer is not None:
+            self.after_cancel(self._timer)
+            self._timer = None
+
+    def _destroy_cb(self, event):
+        if event.widget is self:
+            self.stop()
+            self.manager.sample_cb_remove(self._sample_cb)
+
+    def _sample_cb(self, snapshot: ArmSnapshot):
+        # Called on the serial thread, a deque append needs no lock.
+        self._samples.append((self.manager.clock.monotonic(), snapshot.position))
+
+    def _text_set(self, label: Label, text: str):
+        if self._texts.get(label) != text:
+            self._texts[label] = text
+            label.configure(text=text)
+
+    def _frame(self):
+        self._timer = self.after(self.interval, self._frame)
+        snapshot = self.manager.snapshot_get()
+        if snapshot is not self._snapshot:
+            previous = self._snapshot
+            self._snapshot = snapshot
+            self._table_update(snapshot, previous)
+        now = self.manager.clock.monotonic()
+        if now - self._stats_time >= self.STATS_INTERVAL:
+            self._stats_time = now
+            stats = self.manager.link_stats()
+            self._text_set(self._stats, 'TX {:.0f} B/s  RX {:.0f} B/s  Util {:.0%}  '
+                           'Queued {}'.format(stats['tx_rate'], stats['rx_rate'],
+                                              stats['tx_util'], stats['queued']))
+        if self._samples and self._samples[-1] is not self._drawn:
+            self._plots_update(snapshot)
+
+    def _table_update(self, snapshot: ArmSnapshot, previous: ArmSnapshot):
+        self._text_set(self._state, 'State: {}'.format(snapshot.state.name))
+        # The angles are only recalculated for the changed positions.
+        position_changed = previous is None or snapshot.position is not previous.position
+        command_changed = previous is None or snapshot.command is not previous.command
+        position = snapshot.position.axises() if position_changed else None
+        command = snapshot.command.axises() if command_changed else None
+        for index, name in enumerate(_AXIS_NAMES):
+            cells = self._cells[index]
+            if command is not None:
+                self._text_set(cells[0], str(snapshot.command[index]))
+                self._text_set(cells[2], _units_str(getattr(command, name)))
+            if position is not None:
+                self._text_set(cells[1], str(snapshot.position[index]))
+                self._text_set(cells[3], _units_str(getattr(position, name)))
+            limit = snapshot.limits & (1 << index)
+            self._text_set(cells[4], 'LIMIT' if limit else '-')
+
+    def _plots_update(self, snapshot: ArmSnapshot):
+        samples = list(self._samples)
+        self._drawn = samples[-1]
+        end = samples[-1][0]
+        start = end - self.history
+        width = self.PLOT_WIDTH
+        height = self.PLOT_HEIGHT
+        for index, (canvas, position_line, command_line) in enumerate(self._plots):
+            command = snapshot.command[index]
+            low = high = command
+            for sample_time, position in samples:
+                if sample_time >= start:
+                    value = position[index]
+                    if value < low:
+                        low = value
+                    elif value > high:
+                        high = value
+            # Keep a minimuim span so noise isn't magnified.
+            margin = max(100, (high - low) // 10)
+            low -= margin
+            high += margin
+            coords = history_columns(samples, index, end, self.history,
+                                     width, height, low, high)
+            if len(coords) == 2:
+                coords += coords
+            if coords:
+                canvas.coords(position_line, *coords)
+            y = height - 1 - (command - low) * (height - 1) / (high - low)
+            canvas.coords(command_line, 0, y, width, y)
+
+
+def _units_str(axis) -> str:
+    if isinstance(axis, LinearAxis):
+        return '{:.1f} mm'.format(axis.mm)
+    return '{:.1f}'.format(axis.angle)
+
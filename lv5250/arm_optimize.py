@@ -0,0 +1,260 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    # The optimizer falls back to pure Python without numpy.
+    np = None
+
+from lv5250 import *
+from lv5250.axises import *
+
+
+def pose_counts(pose) -> tuple:
+    """
+    Returns the (gripper, wrist_roll, wrist_pitch, elbow, shoulder, base)
+    counts of a pose.  The pose can be an Axises, an AxisCounts, a count
+    tuple or a program row, a row's speed is ignored.
+    """
+    if isinstance(pose, Axises):
+        return pose.counts_get()
+    return tuple(int(counts) for counts in pose[:6])
+
+
+class CycleOptimizer:
+    """
+    Pick and Place Visit Order Optimizer
+
+    Orders a set of targets to minimise the total travel time.  The axises
+    move at the same time during a RUN so the time of each move is the time
+    of its slowest axis, the largest axis distance divided by the axis rate,
+    rather than the total distance.
+
+    A target is either a single pose or a (pick, place) pair of poses which
+    are visited one after the other.  The order is built by nearest neighbour
+    and improved with 2-opt segment reversals, for single poses, and or-opt
+    segment moves until no improvement is found or the time limit expires.
+    The cost matrix and the improvement passes are vectorized with numpy if
+    it's installed, otherwise pure Python is used which is only practical
+    for a few hundred targets.
+
+    Parameters:
+    targets: The poses or (pick, place) pose pairs, see pose_counts().
+    start: Optional pose the Arm starts from, such as the current position.
+    speed: The RUN speed (1 to 99 %)
+    rates: Optional per axis rates at 100 % speed (encoder counts per
+    second) in AxisType order.
+    """
+
+    # Default axis rates at 100 % speed (encoder counts per second)
+    RATES = (20000,) * 6
+
+    # Default optimization time limit (seconds)
+    TIME_LIMIT = 0.3
+
+    def __init__(self, targets, start=None, speed: int = 50, rates=None):
+        targets = list(targets)
+        self.pairs = bool(targets) and _is_pair(targets[0])
+        if self.pairs:
+            self._starts = [pose_counts(pick) for pick, _ in targets]
+            self._ends = [pose_counts(place) for _, place in targets]
+        else:
+            self._starts = [pose_counts(pose) for pose in targets]
+            self._ends = self._starts
+        self.start = None if start is None else pose_counts(start)
+        self.speed = max(1, min(99, int(speed)))
+        self.rates = tuple(rates or self.RATES)
+        self.count = len(targets)
+        # Seconds per encoder count for each axis at the speed.
+        self._scale = tuple(100 / (rate * self.speed) for rate in self.rates)
+        self.cost = self._cost_matrix()
+
+    def _cost_matrix(self):
+        """
+        Returns the travel times between the targets.  cost[i][j] is the
+        time from the end of target i to the start of target j.  Row and
+        column n are the start pose, the times to the start pose are zero
+        since the path doesn't return.
+        """
+        n = self.count
+        if np is not None:
+            # Scaled to seconds, one row per axis.  Single precision halves
+            # the memory traffic of the large matrices.
+            scale = np.array(self._scale)
+            ends = (np.array(self._ends + [self.start or (0,) * 6]) * scale).T
+            ends = ends.astype(np.float32)
+            starts = (np.array(self._starts + [(0,) * 6]) * scale).T
+            starts = starts.astype(np.float32)
+            # Chebyshev distance, the slowest axis sets the move time.
+            cost = np.zeros((n + 1, n + 1), dtype=np.float32)
+            distance = np.empty_like(cost)
+            for axis in range(6):
+                np.subtract(ends[axis, :, None], starts[axis, None, :], out=distance)
+                np.abs(distance, out=distance)
+                np.maximum(cost, distance, out=cost)
+            cost[:, n] = 0.0
+            if self.start is None:
+                cost[n, :] = 0.0
+            return cost
+
+        ends = self._ends + [self.start or (0,) * 6]
+        cost = [[max(abs(a - b) * s for a, b, s in zip(end, start, self._scale))
+                 for start in self._starts] + [0.0] for end in ends]
+        if self.start is None:
+            cost[n] = [0.0] * (n + 1)
+        return cost
+
+    def travel_time(self, order) -> float:
+        """
+        Returns the total travel time of the targets visited in an order,
+        excluding the pick to place moves of target pairs (seconds)
+        """
+        cost = self.cost
+        total = 0.0
+        previous = self.count
+        for index in order:
+            total += cost[previous][index]
+            previous = index
+        return float(total)
+
+    def order(self, time_limit: float = TIME_LIMIT) -> list:
+        """
+        Returns the target indexes in the optimized visit order.
+
+        Parameters:
+        time_limit: The maximuim optimization time (seconds), the nearest
+        neighbour order is always completed.
+        """
+        if self.count < 3:
+            return list(range(self.count))
+        deadline = time.monotonic() + time_limit
+        if np is not None:
+            path = self._nearest_np()
+            improved = True
+            while improved and time.monotonic() < deadline:
+                improved = False
+                if not self.pairs:
+                    improved |= self._two_opt_np(path, deadline)
+                improved |= self._or_opt_np(path, deadline)
+            return [int(index) for index in path[1:]]
+
+        path = self._nearest_py()
+        if not self.pairs:
+            while time.monotonic() < deadline and self._two_opt_py(path, deadline):
+                pass
+        return path[1:]
+
+    def _nearest_np(self):
+        n = self.count
+        cost = self.cost
+        visited = np.zeros(n + 1, dtype=bool)
+        visited[n] = True
+        path = np.empty(n + 1, dtype=np.intp)
+        path[0] = current = n
+        for position in range(1, n + 1):
+            row = np.where(visited, np.inf, cost[current])
+            current = int(row.argmin())
+            visited[current] = True
+            path[position] = current
+        return path
+
+    def _two_opt_np(self, path, deadline) -> bool:
+        """
+        Reverse the path segments which shorten the path.  path[0] is the
+        start pose.  Returns True if the path was improved.
+        """
+        cost = self.cost
+        n = self.count
+        improved = False
+        for i in range(1, n):
+            if time.monotonic() > deadline:
+                break
+            a = path[i - 1]
+            b = path[i]
+            c = path[i + 1:]
+            # The node after each candidate segment end, the last segment
+            # end has no next node.
+            d = path[i + 2:]
+            delta = cost[a, c] - cost[a, b]
+            delta[:-1] += cost[b, d] - cost[c[:-1], d]
+            j = int(delta.argmin())
+            if delta[j] < -1e-9:
+                path[i:i + j + 2] = path[i:i + j + 2][::-1].copy()
+                improved = True
+        return improved
+
+    def _or_opt_np(self, path, deadline) -> bool:
+        """
+        Move the path segments of up to 3 targets, without reversing them,
+        to the position which shortens the path most.  Returns True if the
+        path was improved.
+        """
+        cost = self.cost
+        n = self.count
+        improved = False
+        for length in (1, 2, 3):
+            i = 1
+            while i + length <= n + 1:
+                if time.monotonic() > deadline:
+                    return improved
+                first = path[i]
+                last = path[i + length - 1]
+                prev = path[i - 1]
+                removed = cost[prev, first]
+                if i + length <= n:
+                    after = path[i + length]
+                    removed += cost[last, after] - cost[prev, after]
+                rest = np.concatenate((path[:i], path[i + length:]))
+                # Insert after rest[k], before rest[k + 1] if there is one.
+                added = cost[rest, first].copy()
+                added[:-1] += cost[last, rest[1:]] - cost[rest[:-1], rest[1:]]
+                k = int(added.argmin())
+                if added[k] < removed - 1e-9:
+                    segment = path[i:i + length].copy()
+                    path[:] = np.concatenate((rest[:k + 1], segment, rest[k + 1:]))
+                    improved = True
+                i += 1
+        return improved
+
+    def _nearest_py(self) -> list:
+        n = self.count
+        cost = self.cost
+        unvisited = set(range(n))
+        path = [n]
+        current = n
+        while unvisited:
+            row = cost[current]
+            current = min(unvisited, key=row.__getitem__)
+            unvisited.remove(current)
+            path.append(current)
+        return path
+
+    def _two_opt_py(self, path, deadline) -> bool:
+        cost = self.cost
+        n = self.count
+        improved = False
+        for i in range(1, n):
+            if time.monotonic() > deadline:
+                break
+            a = path[i - 1]
+            b = path[i]
+            cost_a = cost[a]
+            cost_b = cost[b]
+            base = cost_a[b]
+            for j in range(i + 1, n + 1):
+                c = path[j]
+                delta = cost_a[c] - base
+                if j < n:
+                    d = path[j + 1]
+                    delta += cost_b[d] - cost[c][d]
+                if delta < -1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+                    break
+        return improved
+
+
+def _is_pair(target) -> bool:
+    # A (pick, place) pair rather than a single pose.
+    return (not isinstance(target, Axises) and len(target) == 2
+            and not isinstance(target[0], int))
@@ -0,0 +1,135 @@
+import mmap
+import struct
+
+from lv5250 import *
+from lv5250.axises import *
+
+
+class ArmProgram:
+    """
+    Memory Mapped Binary Waypoint Program
+
+    Stores an Arm program as a fixed size header followed by one fixed size
+    row per waypoint.  The file is memory mapped when opened so only the rows
+    which are currently being sent are resident in memory, allowing programs
+    with tens of thousands of waypoints to start immediately.
+
+    File Layout (little endian):
+
+    Header: magic (4 bytes), version (uint16), fields per row (uint16),
+    row count (uint32), reserved (uint32)
+
+    Row: gripper, wrist roll, wrist pitch, elbow, shoulder and base encoder
+    counts followed by the move speed (1 to 99 %), each stored as an int32.
+
+    Parameters:
+    path: The program file path.
+    """
+
+    MAGIC = b'LV5P'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHII')
+    ROW = struct.Struct('<7i')
+    ROW_FIELDS = 7
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Zero length files can't be memory mapped.
+            self._file.close()
+            raise ValueError(f'Invalid Program File: {path}')
+
+        if len(self._mmap) < self.HEADER.size:
+            self.close()
+            raise ValueError(f'Invalid Program File: {path}')
+
+        magic, version, fields, count, _ = self.HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION \
+                or fields != self.ROW_FIELDS \
+                or len(self._mmap) != self.HEADER.size + count * self.ROW.size:
+            self.close()
+            raise ValueError(f'Invalid Program File: {path}')
+
+        # The number of waypoint rows in the program.
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        """
+        Iterate over the program rows.
+
+        Each row is returned as a tuple of (gripper, wrist_roll, wrist_pitch,
+        elbow, shoulder, base, speed) which is unpacked directly from the
+        memory mapped file.
+        """
+        return self.ROW.iter_unpack(
+            memoryview(self._mmap)[self.HEADER.size:])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def row(self, index: int) -> tuple:
+        """
+        Returns a single program row by index.
+        """
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('Program row index out of range')
+        return self.ROW.unpack_from(
+            self._mmap, self.HEADER.size + index * self.ROW.size)
+
+    def close(self):
+        """
+        Close the program file.  Note that the program can't be closed while
+        a row iterator is still in use.
+        """
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def axises_row(speed: int, axises: Axises) -> tuple:
+        """
+        Create a program row from a speed and an Axises position.
+        """
+        return axises.counts_get() + (int(speed),)
+
+    @classmethod
+    def write(cls, path, rows) -> int:
+        """
+        Write a program file.
+
+        The rows are written as they are read from the iterable so large
+        programs can be generated without holding them in memory.
+
+        Parameters:
+        path: The program file path.
+        rows: Iterable of (gripper, wrist_roll, wrist_pitch, elbow, shoulder,
+        base, speed) tuples.
+
+        Returns:
+        The number of rows written.
+        """
+        count = 0
+        with open(path, 'wb') as file:
+            # Write a placeholder header and fill in the count at the end.
+            file.write(cls.HEADER.pack(
+                cls.MAGIC, cls.VERSION, cls.ROW_FIELDS, 0, 0))
+            for row in rows:
+                file.write(cls.ROW.pack(*row))
+                count += 1
+            file.seek(0)
+            file.write(cls.HEADER.pack(
+                cls.MAGIC, cls.VERSION, cls.ROW_FIELDS, count, 0))
+        return count
@@ -0,0 +1,164 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+from lv5250 import *
+
+
+# Block header: sequence (uint64), samples written (uint64),
+# ring size (uint32) and padding.
+SHM_HEADER = struct.Struct('<QQI4x')
+
+# Sample: timestamp (double), gripper, wrist roll, wrist pitch, elbow,
+# shoulder and base counts and the limit switch bits (int32) with padding.
+SHM_SAMPLE = struct.Struct('<d6ii4x')
+
+# Offsets of the latest sample and the sample ring.
+SHM_LATEST = 32
+SHM_RING = SHM_LATEST + SHM_SAMPLE.size
+
+_SEQ = struct.Struct('<Q')
+
+
+def shm_size(ring_size: int) -> int:
+    """
+    Returns the shared memory block size for a ring size.
+    """
+    return SHM_RING + ring_size * SHM_SAMPLE.size
+
+
+class ArmShmPublisher:
+    """
+    Shared Memory Arm State Publisher
+
+    Publishes each Arm position sample into a shared memory block holding
+    the latest sample and a ring of recent samples.  The block is protected
+    by a sequence lock: the sequence is odd while a sample is being written
+    so readers can detect and retry torn reads without any locking.
+
+    Parameters:
+    name: The shared memory block name.
+    ring_size: The number of recent samples to keep.
+    """
+
+    def __init__(self, name: str, ring_size: int = 256):
+        self.ring_size = int(ring_size)
+        try:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=shm_size(self.ring_size))
+        except FileExistsError:
+            # Reuse a block left behind by a previous publisher.
+            self._shm = shared_memory.SharedMemory(name=name)
+            if self._shm.size < shm_size(self.ring_size):
+                self._shm.close()
+                raise
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+        self._seq = 0
+        self._count = 0
+        SHM_HEADER.pack_into(self._buf, 0, 0, 0, self.ring_size)
+
+    def publish(self, counts: tuple, limits: int = 0, timestamp: float = None):
+        """
+        Publish a sample.  Only called from a single writer thread.
+
+        Parameters:
+        counts: The (gripper, wrist_roll, wrist_pitch, elbow, shoulder,
+        base) position counts.
+        limits: The limit switch bits.
+        timestamp: The sample time (seconds), defaults to time.time()
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        buf = self._buf
+        # Odd sequence, write in progress.
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+        SHM_SAMPLE.pack_into(buf, SHM_LATEST, timestamp, *counts, limits)
+        SHM_SAMPLE.pack_into(
+            buf, SHM_RING + (self._count % self.ring_size) * SHM_SAMPLE.size,
+            timestamp, *counts, limits)
+        self._count += 1
+        SHM_HEADER.pack_into(buf, 0, self._seq, self._count, self.ring_size)
+        # Even sequence, write complete.
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+
+    def close(self, unlink: bool = True):
+        """
+        Close the shared memory block and optionally remove it.
+        """
+        self._buf = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class ArmShmReader:
+    """
+    Shared Memory Arm State Reader
+
+    Maps a block created by an ArmShmPublisher.  Reads copy the sample out of
+    the mapped memory and retry if the sequence shows a write happened
+    during the copy, so no system calls or locks are used.
+
+    Parameters:
+    name: The shared memory block name.
+    """
+
+    def __init__(self, name: str):
+        self._shm = shared_memory.SharedMemory(name=name)
+        try:
+            # The publisher owns the block, don't let the resource tracker
+            # remove it when this process exits.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        except Exception:
+            pass
+        self._buf = self._shm.buf
+        _, _, self.ring_size = SHM_HEADER.unpack_from(self._buf, 0)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns a consistent copy of the latest sample as a
+        (timestamp, counts, limits, count) tuple where count is the number
+        of samples published.  The timestamp is 0 if nothing has been
+        published.
+        """
+        buf = self._buf
+        while True:
+            seq, count, _ = SHM_HEADER.unpack_from(buf, 0)
+            if seq & 1:
+                continue
+            sample = SHM_SAMPLE.unpack_from(buf, SHM_LATEST)
+            if _SEQ.unpack_from(buf, 0)[0] == seq:
+                return sample[0], sample[1:7], sample[7], count
+
+    def history(self, samples: int = None) -> list:
+        """
+        Returns a consistent copy of the most recent samples, oldest first,
+        as a list of (timestamp, counts, limits) tuples.
+
+        Parameters:
+        samples: The maximuim number of samples, defaults to the ring size.
+        """
+        buf = self._buf
+        if samples is None or samples > self.ring_size:
+            samples = self.ring_size
+        while True:
+            seq, count, _ = SHM_HEADER.unpack_from(buf, 0)
+            if seq & 1:
+                continue
+            ring = bytes(buf[SHM_RING:SHM_RING + self.ring_size * SHM_SAMPLE.size])
+            if _SEQ.unpack_from(buf, 0)[0] == seq:
+                break
+        result = []
+        for index in range(max(count - samples, 0), count):
+            sample = SHM_SAMPLE.unpack_from(
+                ring, (index % self.ring_size) * SHM_SAMPLE.size)
+            result.append((sample[0], sample[1:7], sample[7]))
+        return result
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
@@ -0,0 +1,203 @@
+import threading
+
+from lv5250 import *
+from lv5250.arm_clock import *
+from lv5250.arm_transport import *
+from lv5250.arm_config import ArmConfig
+
+
+class ArmSim:
+    """
+    Simulated LabVolt 5250 Arm
+
+    Stands in for the Arm on the other end of a transport, such as the peer
+    of a loop:// transport or a TCP connection, for testing and
+    benchmarking.  The simulation only models the command responses, the
+    move times and the constant speed MOVE motion, not the Arm dynamics.
+    The Gripper stops at the ends of its travel under a MOVE command, the
+    other axises don't stop.  The axises move linearly during a RUN command
+    so commands such as GET POS are answered during the move and the >END
+    is sent when the move ends.  A RUN received during a move supersedes
+    it, the new move starts from the current position and the earlier
+    move's >END isn't sent.  A STOP cancels the move without an >END.
+
+    Parameters:
+    transport: The transport to serve the Arm protocol on.
+    rate: The axis speed at 100 % speed (encoder counts per second)
+    clock: Optional clock for the move times, defaults to the transport's
+    clock.
+    """
+
+    def __init__(self, transport: Transport, rate: float = 20000,
+                 clock: Clock = None):
+        self.transport = transport
+        self.clock = clock or transport.clock
+        self.rate = float(rate)
+        # The (gripper, wrist_roll, wrist_pitch, elbow, shoulder, base)
+        # position counts.
+        self.position = [0] * 6
+        # The MOVE command axis velocities (counts per second)
+        self.velocity = [0.0] * 6
+        self._moved = self.clock.monotonic()
+        # The current RUN move as (start time, end time, start position,
+        # target) and a count of the STOPs and superseding RUNs which cancel
+        # the >END.
+        self._runs = []
+        self._cancels = 0
+        self._write_lock = threading.Lock()
+        self.limits = 0
+        self.estop = 0
+        self.torque = 1
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start serving the Arm protocol on a background thread.
+        """
+        self._thread = self.clock.thread(self.run)
+        self._thread.start()
+
+    def run(self) -> None:
+        """
+        Serve the Arm protocol until the transport is closed.
+        """
+        while self.transport.is_open:
+            try:
+                line = self.transport.readline()
+            except OSError:
+                break
+            command = line.decode('ascii', 'replace').strip()
+            if command:
+                try:
+                    self.command_handle(command)
+                except OSError:
+                    break
+
+    def command_handle(self, command: str) -> None:
+        """
+        Handle a single command and write its responses.
+        """
+        words = command.split()
+        name = words[0]
+        self._position_update()
+        if command.startswith('GET POS'):
+            self._write('P {} {} {} {} {} {} 0 0'.format(*self.position))
+        elif name == '?':
+            self._write(self.status_str())
+        elif name == 'RUN' and len(words) == 11:
+            speed = max(1, min(99, int(words[1])))
+            target = [int(word) for word in words[3:9]]
+            self._run(target, speed)
+        elif name == 'MOVE':
+            if len(words) == 4:
+                speed, axis, direction = (int(word) for word in words[1:])
+                if 0 <= axis < 6:
+                    self.velocity[axis] = direction * self.rate * speed / 100
+            self._write('>OK')
+        elif name == 'HARDHOME':
+            self._run([0] * 6, 50)
+        elif name in ('STOP', 'REMOTE', 'TORQUE', 'FREE', 'SHUTDOWN', 'SET'):
+            if name == 'STOP':
+                self.velocity = [0.0] * 6
+                self._runs = []
+                self._cancels += 1
+            elif name == 'TORQUE':
+                self.torque = 1
+            elif name == 'FREE':
+                self.torque = 0
+            elif name == 'SET' and len(words) == 3 and words[1] == 'ESTOP':
+                self.estop = int(words[2])
+            self._write('>OK')
+        else:
+            self._write(f'ERR {command}')
+
+    def status_str(self) -> str:
+        """
+        Returns the 23 field status response for the current state.
+        """
+        fields = ['?'] + ['0'] * 22
+        fields[1] = str(self.estop)
+        fields[2] = str(self.torque)
+        fields[8] = str(self.limits)
+        for index, counts in enumerate(self.position):
+            fields[10 + index] = str(counts)
+        return ' '.join(fields)
+
+    def _position_update(self):
+        """
+        Advance the positions of the axises moving under a MOVE or a RUN
+        command.
+        """
+        now = self.clock.monotonic()
+        elapsed = now - self._moved
+        self._moved = now
+        for axis, velocity in enumerate(self.velocity):
+            if velocity:
+                self.position[axis] += round(velocity * elapsed)
+        if self.velocity[0]:
+            self.position[0] = max(ArmConfig.GRIPPER_MIN,
+                                   min(ArmConfig.GRIPPER_MAX, self.position[0]))
+        while self._runs:
+            start, end, origin, target = self._runs[0]
+            if now >= end:
+                self.position = list(target)
+                self._runs.pop(0)
+                continue
+            if now > start:
+                fraction = (now - start) / (end - start)
+                self.position = [round(o + (t - o) * fraction)
+                                 for o, t in zip(origin, target)]
+            break
+
+    def _run(self, target: list, speed: int):
+        """
+        Start a move to a target, the >END is sent when the move ends.
+        """
+        start = self.clock.monotonic()
+        origin = list(self.position)
+        if self._runs:
+            # Supersede the current move.
+            self._cancels += 1
+        distance = max(abs(t - p) for t, p in zip(target, origin))
+        end = start + distance / (self.rate * speed / 100)
+        self._runs = [(start, end, origin, list(target))]
+        cancels = self._cancels
+
+        def end_send():
+            self.clock.sleep(max(0.0, end - self.clock.monotonic()))
+            if cancels == self._cancels:
+                try:
+                    self._write('>END')
+                except OSError:
+                    pass
+
+        self.clock.thread(end_send).start()
+
+    def _write(self, resp: str):
+        with self._write_lock:
+            self.transport.write(bytes(resp + '\r\n', 'ascii'))
+
+
+def arm_sim_serve_tcp(host: str = '127.0.0.1', port: int = 0, ready=None,
+                      rate: float = 20000) -> None:
+    """
+    Serve a simulated Arm over TCP, each connection is served by its own
+    simulated Arm on a separate thread.
+
+    Parameters:
+    host: The address to listen on.
+    port: The TCP port, 0 selects a free port.
+    ready: Optional callable which is passed the port once listening.
+    rate: The simulated axis speed at 100 % speed (counts per second)
+    """
+    import socket
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+    if callable(ready):
+        ready(server.getsockname()[1])
+    while True:
+        sock, _ = server.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        ArmSim(SocketTransport.from_socket(sock), rate).start()
@@ -0,0 +1,95 @@
+from typing import NamedTuple
+
+from lv5250 import *
+from lv5250.arm import *
+from lv5250.axis import *
+from lv5250.axises import *
+from lv5250.arm_link import MsgResult
+
+
+class AxisCounts(NamedTuple):
+    """
+    Immutable Arm Axis Positions
+
+    The six axis positions in encoder counts, in AxisType order so an axis
+    can be indexed by its AxisType value.
+    """
+    gripper: int = 0
+    wrist_roll: int = 0
+    wrist_pitch: int = 0
+    elbow: int = 0
+    shoulder: int = 0
+    base: int = 0
+
+    def with_axis(self, axis: AxisType, counts: int) -> 'AxisCounts':
+        """
+        Returns a copy with a single axis position replaced.
+        """
+        index = AxisType(axis).value
+        return AxisCounts._make(self[:index] + (int(counts),) + self[index + 1:])
+
+    def axises(self, limits_en: bool = False) -> Axises:
+        """
+        Returns a new Axises object set to the positions, for converting the
+        positions to degrees or millimeters.
+
+        Parameters:
+        limits_en: Should the Axises constrain the positions to the limits?
+        """
+        axises = Axises(limits_en)
+        axises.counts_set(self)
+        return axises
+
+
+class ArmSnapshot(NamedTuple):
+    """
+    Immutable Arm State Snapshot
+
+    Published by the ArmManager in place of the Arm object it updates.  A
+    snapshot never changes so it can be shared between threads, hashed and
+    compared without copying.  Snapshots share their unchanged position and
+    command tuples with the previous snapshot.
+
+    position: The current Arm position.
+    command: The most recently commanded position.
+    state: The Arm connection state.
+    limits: The limit switch bits from the most recent status.
+    result: The outcome of the command in the snapshot passed to the
+    command's final callback, MsgResult.TIMEOUT or MsgResult.CANCELLED if
+    the command didn't complete.  Always MsgResult.COMPLETED otherwise.
+    """
+    position: AxisCounts = AxisCounts()
+    command: AxisCounts = AxisCounts()
+    state: ArmConnectionState = ArmConnectionState.UNKNOWN
+    limits: int = 0
+    result: MsgResult = MsgResult.COMPLETED
+
+    def with_axis(self, axis: AxisType, counts: int) -> 'ArmSnapshot':
+        """
+        Returns a copy with a single commanded axis position replaced, for
+        example to derive a new move command from the current command.
+        """
+        return self._replace(command=self.command.with_axis(axis, counts))
+
+    @classmethod
+    def from_arm(cls, arm: Arm, limits: int = 0, previous=None) -> 'ArmSnapshot':
+        """
+        Create a snapshot of an Arm object.
+
+        Parameters:
+        arm: The Arm to copy.
+        limits: The limit switch bits.
+        previous: Optional previous snapshot, its position and command are
+        reused if they haven't changed.
+        """
+        position = AxisCounts._make(arm.position.counts_get())
+        command = AxisCounts._make(arm.command.counts_get())
+        if previous is not None:
+            if position == previous.position:
+                position = previous.position
+            if command == previous.command:
+                command = previous.command
+            if (position is previous.position and command is previous.command
+                    and arm.state == previous.state and limits == previous.limits):
+                return previous
+        return cls(position, command, arm.state, limits)
@@ -0,0 +1,85 @@
+from typing import NamedTuple
+
+from lv5250 import *
+from lv5250.arm_snapshot import *
+
+
+class ArmStatus(NamedTuple):
+    """
+    Decoded Arm Status Response
+
+    The Arm's ? command responds with a ? followed by 22 fields.  The limit
+    switch bits (field 8) and the axis positions (fields 10 to 15) are known.
+    The E-Stop (field 1), Torque (field 2) and Gripper state (field 9) fields
+    are assumed from the controller's behaviour and aren't documented.  The
+    remaining fields are kept as the raw strings so no information is lost.
+
+    estop: The E-Stop state, non zero if the E-Stop is active.
+    torque: The Torque state, non zero if the motors are powered and zero
+    after a FREE command.
+    limits: The limit switch bits, see AxisType.
+    gripper_state: The Gripper state, non zero if the Gripper is holding an
+    object.
+    gripper ... base: The axis positions (encoder counts)
+    field3 ... field22: The undecoded fields.
+    """
+    estop: int = 0
+    torque: int = 0
+    field3: str = '0'
+    field4: str = '0'
+    field5: str = '0'
+    field6: str = '0'
+    field7: str = '0'
+    limits: int = 0
+    gripper_state: int = 0
+    gripper: int = 0
+    wrist_roll: int = 0
+    wrist_pitch: int = 0
+    elbow: int = 0
+    shoulder: int = 0
+    base: int = 0
+    field16: str = '0'
+    field17: str = '0'
+    field18: str = '0'
+    field19: str = '0'
+    field20: str = '0'
+    field21: str = '0'
+    field22: str = '0'
+
+    @classmethod
+    def parse(cls, resp: str):
+        """
+        Decode a status response.  Returns None if the response isn't a 23
+        field status or a decoded field isn't an integer.
+        """
+        fields = resp.split()
+        if len(fields) != 23 or fields[0] != '?':
+            return None
+        try:
+            return cls._make(
+                int(value) if field_type is int else value
+                for field_type, value in zip(_FIELD_TYPES, fields[1:]))
+        except ValueError:
+            return None
+
+    @property
+    def position(self) -> AxisCounts:
+        """
+        The axis positions in AxisType order.
+        """
+        return AxisCounts._make(self[9:15])
+
+    def changed(self, previous=None) -> tuple:
+        """
+        Returns the names of the fields which differ from a previous status,
+        all of the field names if there is no previous status.
+        """
+        if previous is None:
+            return self._fields
+        if self == previous:
+            return ()
+        return tuple(name for name, value, old in zip(self._fields, self, previous)
+                     if value != old)
+
+
+_FIELD_TYPES = tuple(ArmStatus.__annotations__.values())
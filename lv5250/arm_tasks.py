@@ -0,0 +1,286 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from lv5250 import *
+from lv5250.arm_manager import *
+
+
+class ArmCommandError(Exception):
+    """
+    Raised, or recorded as a link task's error, when an Arm command timed
+    out or was cancelled.
+
+    Parameters:
+    result: The command's MsgResult.
+    """
+
+    def __init__(self, result: MsgResult):
+        super().__init__('Command {}'.format(result.name.title()))
+        self.result = result
+
+
+class ArmTask:
+    """
+    Arm Task Graph Step
+
+    Parameters:
+    name: Unique task name.
+    func: The task function.
+    deps: Names of the tasks which must complete before the task starts.
+    link: Does the task use the serial link?
+    """
+
+    def __init__(self, name: str, func, deps: tuple = (), link: bool = False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.link = bool(link)
+        # Names of the tasks which depend on this task.
+        self.dependents = []
+        self._reset()
+
+    def _reset(self):
+        # Number of dependencies which haven't completed.
+        self.waiting = len(self.deps)
+        # The time the task became ready, started and ended (seconds)
+        self.ready_time = None
+        self.start_time = None
+        self.end_time = None
+        # The task which completed last before this task started.  Used to
+        # trace the critical path.
+        self.gated_by = None
+        self.result = None
+        self.error = None
+        self.skipped = False
+
+    @property
+    def duration(self) -> float:
+        """
+        Get the task run time (seconds)
+        """
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+
+class ArmTaskGraph:
+    """
+    Dependency Graph Task Executor
+
+    Runs a set of tasks as soon as their dependencies have completed.  Tasks
+    which don't use the serial link are run concurrently on a thread pool.
+    Link tasks are run one at a time so each task's commands are sent in
+    order and the task completes when its command completes.
+
+    Non link task functions have the form func(results : dict) -> result
+    where results holds the results of the completed tasks by name.
+
+    Link task functions have the form func(manager : ArmManager, cb) and must
+    queue an ArmManager command with cb as its completion callback.  The
+    task result is the Arm Snapshot passed to the callback.  A link task
+    fails with an ArmCommandError, and its dependents are skipped, if the
+    snapshot's result shows the command timed out or was cancelled.
+
+    Parameters:
+    manager: The ArmManager for link tasks.
+    max_workers: Maximuim number of concurrent non link tasks.
+    """
+
+    def __init__(self, manager: ArmManager, max_workers: int = 4):
+        self._manager = manager
+        self._clock = manager.clock
+        self._max_workers = max_workers
+        self._tasks = collections.OrderedDict()
+        self._cond = self._clock.condition()
+        self._link_ready = collections.deque()
+        self._link_busy = False
+        self._remaining = 0
+        self._executor = None
+        self._start_time = None
+
+    @property
+    def tasks(self) -> dict:
+        """
+        Get the tasks by name.
+        """
+        return self._tasks
+
+    def add(self, name: str, func, deps: tuple = (), link: bool = False) -> str:
+        """
+        Add a task to the graph.  Dependencies must be added before the tasks
+        which depend on them so the graph can't contain a cycle.
+
+        Parameters:
+        name: Unique task name.
+        func: The task function.
+        deps: Names of the tasks which must complete before the task starts.
+        link: Does the task use the serial link?
+
+        Returns:
+        The task name.
+        """
+        if name in self._tasks:
+            raise ValueError(f'Duplicate Task: {name}')
+        for dep in deps:
+            if dep not in self._tasks:
+                raise ValueError(f'Task {name} Unknown Dependency: {dep}')
+        task = ArmTask(name, func, deps, link)
+        for dep in task.deps:
+            self._tasks[dep].dependents.append(name)
+        self._tasks[name] = task
+        return name
+
+    def run(self, timeout: float = None) -> dict:
+        """
+        Run the task graph.
+
+        Tasks which raise an exception are recorded in their error attribute
+        and the tasks which depend on them are skipped.
+
+        Parameters:
+        timeout: Maximuim time to wait for the graph to complete (seconds)
+
+        Returns:
+        The results of the completed tasks by name.
+        """
+        with self._cond:
+            self._start_time = self._clock.monotonic()
+            self._link_ready.clear()
+            self._link_busy = False
+            self._remaining = len(self._tasks)
+            for task in self._tasks.values():
+                task._reset()
+
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            with self._cond:
+                for task in self._tasks.values():
+                    if task.waiting == 0:
+                        self._task_ready(task, None)
+                self._link_next()
+                if not self._cond.wait_for(
+                        lambda: self._remaining == 0, timeout):
+                    print('Task Graph Timeout')
+        finally:
+            self._executor.shutdown(wait=False)
+
+        return {task.name: task.result for task in self._tasks.values()
+                if task.end_time is not None and task.error is None}
+
+    def _task_ready(self, task: ArmTask, gated_by: ArmTask):
+        """
+        Start a task whose dependencies have completed.  Link tasks wait for
+        the link to be free.
+        """
+        task.ready_time = self._clock.monotonic()
+        task.gated_by = gated_by
+        if task.link:
+            self._link_ready.append(task)
+        else:
+            task.start_time = task.ready_time
+            self._executor.submit(self._task_run, task)
+
+    def _link_next(self, gated_by: ArmTask = None):
+        """
+        Start the next ready link task if the link is free.
+        """
+        if self._link_busy or not self._link_ready:
+            return
+        task = self._link_ready.popleft()
+        self._link_busy = True
+        task.start_time = self._clock.monotonic()
+        if gated_by is not None and gated_by.end_time > task.ready_time:
+            # The task was waiting for the link rather than a dependency.
+            task.gated_by = gated_by
+        called = [False]
+
+        def link_cb(arm):
+            # Some commands make more than one callback, only the first
+            # completes the task.
+            with self._cond:
+                if called[0]:
+                    return
+                called[0] = True
+            result = getattr(arm, 'result', MsgResult.COMPLETED)
+            if result != MsgResult.COMPLETED:
+                self._task_done(task, None, ArmCommandError(result))
+            else:
+                self._task_done(task, arm, None)
+
+        try:
+            task.func(self._manager, link_cb)
+        except Exception as e:
+            self._task_done(task, None, e)
+
+    def _task_run(self, task: ArmTask):
+        """
+        Run a non link task on the executor.
+        """
+        results = {name: self._tasks[name].result for name in task.deps}
+        try:
+            result = task.func(results)
+        except Exception as e:
+            self._task_done(task, None, e)
+        else:
+            self._task_done(task, result, None)
+
+    def _task_done(self, task: ArmTask, result, error):
+        """
+        Record the task completion and start the tasks which are now ready.
+        """
+        with self._cond:
+            task.end_time = self._clock.monotonic()
+            task.result = result
+            task.error = error
+            self._remaining -= 1
+            if error is not None:
+                print(f'Task {task.name} Error: {error}')
+                self._skip(task)
+            else:
+                for name in task.dependents:
+                    dependent = self._tasks[name]
+                    dependent.waiting -= 1
+                    if dependent.waiting == 0 and not dependent.skipped:
+                        self._task_ready(dependent, task)
+            if task.link:
+                self._link_busy = False
+            self._link_next(task)
+            self._cond.notify_all()
+
+    def _skip(self, task: ArmTask):
+        """
+        Skip all tasks which depend on a failed task.
+        """
+        for name in task.dependents:
+            dependent = self._tasks[name]
+            if not dependent.skipped:
+                dependent.skipped = True
+                self._remaining -= 1
+                self._skip(dependent)
+
+    def critical_path(self) -> tuple:
+        """
+        Returns the critical path of the last run.
+
+        The path is traced back from the last task to complete through the
+        task which gated each task's start, either its last dependency to
+        complete or the previous link task if it was waiting for the link.
+
+        Returns:
+        A (path, total) tuple where path is a list of (name, duration, wait)
+        tuples in execution order and total is the graph run time (seconds).
+        The wait is the time the task was ready but waiting for the link.
+        """
+        finished = [task for task in self._tasks.values()
+                    if task.end_time is not None]
+        if not finished:
+            return [], 0.0
+        task = max(finished, key=lambda t: t.end_time)
+        total = task.end_time - self._start_time
+        path = []
+        while task is not None:
+            path.append((task.name, task.duration,
+                         task.start_time - task.ready_time))
+            task = task.gated_by
+        path.reverse()
+        return path, total
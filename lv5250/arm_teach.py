@@ -0,0 +1,196 @@
+import math
+import threading
+
+from lv5250 import *
+from lv5250.arm_manager import *
+from lv5250.arm_program import *
+
+
+def path_simplify(points: list, tolerance: float) -> list:
+    """
+    Douglas-Peucker path simplification in joint space.
+
+    Reduces a path to the minimuim set of points for which every removed
+    point lies within the tolerance of the straight joint space segment
+    between the remaining points.  The first and last points are always
+    kept.
+
+    Parameters:
+    points: List of axis encoder count tuples.
+    tolerance: The maximuim allowed deviation (encoder counts)
+
+    Returns:
+    The list of retained points.
+    """
+    count = len(points)
+    if count < 3:
+        return list(points)
+
+    keep = [False] * count
+    keep[0] = True
+    keep[-1] = True
+
+    # Iterative implementation so long recordings don't hit the
+    # recursion limit.
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = points[first]
+        end = points[last]
+        segment = [e - s for s, e in zip(start, end)]
+        length_sq = sum(d * d for d in segment)
+
+        max_dist = -1.0
+        max_index = first
+        for index in range(first + 1, last):
+            point = points[index]
+            offsett = [p - s for s, p in zip(start, point)]
+            if length_sq > 0:
+                # Project the point on to the segment.
+                t = sum(o * d for o, d in zip(offsett, segment)) / length_sq
+                t = min(max(t, 0.0), 1.0)
+                dist_sq = sum((o - t * d) ** 2
+                              for o, d in zip(offsett, segment))
+            else:
+                dist_sq = sum(o * o for o in offsett)
+            if dist_sq > max_dist:
+                max_dist = dist_sq
+                max_index = index
+
+        if math.sqrt(max_dist) > tolerance:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class ArmTeach:
+    """
+    Arm Teach Mode Recorder
+
+    Records the Arm position while it is being moved by hand in Free mode.
+    The position is sampled as fast as the serial link allows by queuing the
+    next Get Position command as soon as the previous one completes.  Each
+    sample is recorded by a sample callback, timestamped with the manager's
+    clock when the position is received.  The recording can then be
+    simplified to a minimuim set of waypoints and replayed.
+
+    Parameters:
+    manager: The ArmManager used to communicate with the Arm.
+    """
+
+    def __init__(self, manager: ArmManager):
+        self._manager = manager
+        self._lock = threading.Lock()
+        self._recording = False
+
+        """
+        The recorded samples as a list of (timestamp, counts) tuples.
+        The timestamp is in seconds and the counts are a (gripper,
+        wrist_roll, wrist_pitch, elbow, shoulder, base) tuple.
+        """
+        self.samples = []
+
+    @property
+    def recording(self) -> bool:
+        """
+        Is a recording in progress?
+        """
+        return self._recording
+
+    def record_start(self) -> None:
+        """
+        Free the Arm and start recording its position.
+        """
+        with self._lock:
+            if self._recording:
+                return
+            self.samples = []
+            self._recording = True
+        self._manager.sample_cb_add(self._sample_cb)
+        self._manager.free_cmd()
+        self._manager.get_pos_cmd(self._poll_cb, quiet=True)
+
+    def record_stop(self) -> list:
+        """
+        Stop recording.  The Arm is left in Free mode.
+
+        Returns:
+        The recorded samples.
+        """
+        with self._lock:
+            self._recording = False
+        self._manager.sample_cb_remove(self._sample_cb)
+        return self.samples
+
+    def _sample_cb(self, arm: ArmSnapshot):
+        """
+        Sample Callback
+
+        Stores the sample, called on the serial thread as the position is
+        received.
+        """
+        with self._lock:
+            if not self._recording:
+                return
+            self.samples.append(
+                (self._manager.clock.monotonic(), tuple(arm.position)))
+
+    def _poll_cb(self, arm: ArmSnapshot):
+        """
+        Get Position Callback
+
+        Queues the next Get Position command while the recording is in
+        progress.
+        """
+        if self._recording:
+            self._manager.get_pos_cmd(self._poll_cb, quiet=True)
+
+    def waypoints(self, tolerance: float = 500) -> list:
+        """
+        Returns the simplified list of recorded waypoints.
+
+        Parameters:
+        tolerance: The maximuim path deviation (encoder counts)
+        """
+        points = []
+        for _, counts in self.samples:
+            # Drop repeated samples recorded while the Arm was stationary.
+            if not points or points[-1] != counts:
+                points.append(counts)
+        return path_simplify(points, tolerance)
+
+    def replay(self, speed: int = 50, tolerance: float = 500, cb=None) -> int:
+        """
+        Enable Torque and replay the simplified recording.
+
+        Parameters:
+        speed: Arm speed,  1 to 99 %
+        tolerance: The maximuim path deviation (encoder counts)
+        cb: Function to be called once the last move has been completed or
+        times out.
+
+        Returns:
+        The number of RUN commands queued.
+        """
+        waypoints = self.waypoints(tolerance)
+        self._manager.torque_cmd()
+        for index, counts in enumerate(waypoints):
+            final_cb = cb if index == len(waypoints) - 1 else None
+            self._manager.move_to_cmd(speed, *counts, cb=final_cb)
+        return len(waypoints)
+
+    def program_write(self, path, speed: int = 50,
+                      tolerance: float = 500) -> int:
+        """
+        Write the simplified recording to a binary program file.
+
+        Returns:
+        The number of program rows written.
+        """
+        return ArmProgram.write(
+            path, (counts + (int(speed),)
+                   for counts in self.waypoints(tolerance)))
@@ -1,15 +1,9 @@
-import arm_cmd
+import sys
 
-import axis
-import encoder
-from axis import *
-from encoder import *
-
-from axis import RotaryAxis
-from axis import LinearAxis
-
-import arm_monitor
-from arm_monitor import *
+from lv5250 import *
+from lv5250.axis import *
+from lv5250.arm_manager import *
+from lv5250.arm_monitor import *
 
 #
 # class ArmTest:
@@ -40,7 +34,21 @@ from arm_monitor import *
 
 
 print("Arm Test Start")
-monitor = ArmMonitor()
+# The port is the first argument, a simulated Arm is used if not set.
+manager = ArmManager(sys.argv[1] if len(sys.argv) > 1 else 'loop://')
+if len(sys.argv) <= 1:
+    from lv5250.arm_sim import ArmSim
+    ArmSim(manager.transport.peer).start()
+monitor = ArmMonitor(manager)
+
+
+def poll():
+    # The monitor only displays the samples, request one every 100 ms.
+    manager.get_pos_cmd()
+    monitor.after(100, poll)
+
+
+poll()
 monitor.mainloop()
 
 #lv5250 = Arm()
@@ -0,0 +1,386 @@
+import collections
+import os
+import select
+
+from lv5250 import *
+from lv5250.arm_clock import *
+
+
+class Transport:
+    """
+    Arm Byte Stream Transport
+
+    Base class for the connections to the Arm.  Transport errors are raised
+    as OSError (or a subclass of it).
+
+    Parameters:
+    timeout: The maximuim time to wait for a line to be received (seconds)
+    """
+
+    def __init__(self, timeout: float = 1.0):
+        self.timeout = float(timeout)
+        self._rx_buffer = bytearray()
+        # The clock the read timeout is measured with.
+        self.clock = REAL_CLOCK
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Is the transport open?
+        """
+        raise NotImplementedError
+
+    def open(self):
+        """
+        Open the transport.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the transport.
+        """
+        raise NotImplementedError
+
+    def write(self, data: bytes) -> int:
+        """
+        Write bytes to the transport.
+        """
+        raise NotImplementedError
+
+    def _read(self, timeout: float) -> bytes:
+        """
+        Read the available bytes waiting up to timeout for at least one
+        byte to arrive.  Returns an empty bytes object on timeout.
+        """
+        raise NotImplementedError
+
+    def readline(self) -> bytes:
+        """
+        Read a line including the line ending.  Returns the partial line
+        received, if any, if the line isn't complete within the timeout.
+        """
+        clock = self.clock
+        deadline = clock.monotonic() + self.timeout
+        while True:
+            index = self._rx_buffer.find(b'\n')
+            if index >= 0:
+                line = bytes(self._rx_buffer[:index + 1])
+                del self._rx_buffer[:index + 1]
+                return line
+            remaining = deadline - clock.monotonic()
+            if remaining <= 0:
+                break
+            data = self._read(remaining)
+            if data:
+                self._rx_buffer += data
+            elif not self.is_open:
+                break
+        line = bytes(self._rx_buffer)
+        self._rx_buffer.clear()
+        return line
+
+    def read_all(self) -> bytes:
+        """
+        Read and return all of the bytes which have already been received.
+        """
+        data = bytes(self._rx_buffer) + self._read(0)
+        self._rx_buffer.clear()
+        return data
+
+
+class SerialTransport(Transport):
+    """
+    Serial Port Transport
+
+    pyserial is imported when the transport is created so it is only
+    required when a serial port is used.
+
+    Parameters:
+    port: The serial port device name.
+    baudrate: The serial port baud rate.
+    timeout: The maximuim time to wait for a line to be received (seconds)
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600, timeout: float = 1.0):
+        super().__init__(timeout)
+        # pyserial (not serial)
+        import serial
+        self.serial = serial.Serial(baudrate=int(baudrate))
+        self.serial.port = port
+        self.serial.bytesize = serial.EIGHTBITS
+        self.serial.parity = serial.PARITY_NONE
+        self.serial.stopbits = serial.STOPBITS_ONE
+        self.serial.xonxoff = False
+        self.serial.rtscts = False
+        self.serial.dsrdtr = False
+        self.serial.exclusive = False
+        self.serial.timeout = self.timeout
+        self.serial.write_timeout = 5.0
+        self.serial.inter_byte_timeout = 0.1
+
+    @property
+    def is_open(self) -> bool:
+        return self.serial.is_open
+
+    def open(self):
+        # close the port if already open
+        if self.serial.is_open:
+            self.serial.close()
+        self.serial.open()
+
+    def close(self):
+        self.serial.close()
+
+    def write(self, data: bytes) -> int:
+        return self.serial.write(data)
+
+    def _read(self, timeout: float) -> bytes:
+        # The timeout is set for each read so the line timeout, including a
+        # changed self.timeout, covers the whole line.
+        self.serial.timeout = max(timeout, 0)
+        return self.serial.read(max(1, self.serial.in_waiting))
+
+
+class _FdTransport(Transport):
+    """
+    File Descriptor Transport Base Class
+    """
+
+    def __init__(self, timeout: float = 1.0):
+        super().__init__(timeout)
+        self._fd = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._fd is not None
+
+    def close(self):
+        fd = self._fd
+        self._fd = None
+        if fd is not None:
+            os.close(fd)
+
+    def write(self, data: bytes) -> int:
+        if self._fd is None:
+            raise OSError('Transport Not Open')
+        view = memoryview(data)
+        while view:
+            count = os.write(self._fd, view)
+            view = view[count:]
+        return len(data)
+
+    def _read(self, timeout: float) -> bytes:
+        fd = self._fd
+        if fd is None:
+            return b''
+        readable, _, _ = select.select([fd], [], [], max(timeout, 0))
+        if not readable:
+            return b''
+        data = os.read(fd, 4096)
+        if not data:
+            # End of file, the other end was closed.
+            self.close()
+        return data
+
+
+class PtyTransport(_FdTransport):
+    """
+    Pseudo Terminal Transport
+
+    Creates a new pseudo terminal pair and communicates over the master side.
+    A simulator or a serial port bridge can be attached to the slave device
+    named by slave_name.  Only available on POSIX systems.
+
+    Parameters:
+    timeout: The maximuim time to wait for a line to be received (seconds)
+    """
+
+    def __init__(self, timeout: float = 1.0):
+        super().__init__(timeout)
+        self._slave_fd = None
+        self.slave_name = None
+
+    def open(self):
+        import tty
+        self.close()
+        self._fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        self.slave_name = os.ttyname(self._slave_fd)
+
+    def close(self):
+        super().close()
+        if self._slave_fd is not None:
+            os.close(self._slave_fd)
+            self._slave_fd = None
+
+
+class SocketTransport(Transport):
+    """
+    TCP Socket Transport
+
+    Connects to a serial port server or an Arm simulator over TCP.
+
+    Parameters:
+    host: The host name or address.
+    port: The TCP port number.
+    timeout: The maximuim time to wait for a line to be received (seconds)
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 1.0):
+        super().__init__(timeout)
+        self.host = host
+        self.port = int(port)
+        self._socket = None
+
+    @classmethod
+    def from_socket(cls, sock, timeout: float = 1.0):
+        """
+        Create an open transport from an already connected socket, such as
+        one returned by accept().
+        """
+        host, port = sock.getpeername()[:2]
+        transport = cls(host, port, timeout)
+        transport._socket = sock
+        return transport
+
+    @property
+    def is_open(self) -> bool:
+        return self._socket is not None
+
+    def open(self):
+        import socket
+        self.close()
+        self._socket = socket.create_connection(
+            (self.host, self.port), timeout=5.0)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        sock = self._socket
+        self._socket = None
+        if sock is not None:
+            sock.close()
+
+    def write(self, data: bytes) -> int:
+        if self._socket is None:
+            raise OSError('Transport Not Open')
+        self._socket.sendall(data)
+        return len(data)
+
+    def _read(self, timeout: float) -> bytes:
+        sock = self._socket
+        if sock is None:
+            return b''
+        readable, _, _ = select.select([sock], [], [], max(timeout, 0))
+        if not readable:
+            return b''
+        data = sock.recv(4096)
+        if not data:
+            # The connection was closed.
+            self.close()
+        return data
+
+
+class LoopbackTransport(Transport):
+    """
+    In Memory Loopback Transport
+
+    Bytes written to the transport are received by its peer and bytes
+    written to the peer are received by the transport.  The peer can be used
+    by tests or a simulator to stand in for the Arm.
+
+    Parameters:
+    timeout: The maximuim time to wait for a line to be received (seconds)
+    peer: The other end of the loopback, created if not supplied.
+    clock: Optional clock for the read timeouts, such as a SimClock.
+    """
+
+    def __init__(self, timeout: float = 1.0, peer=None, clock: Clock = None):
+        super().__init__(timeout)
+        self.clock = clock or REAL_CLOCK
+        self._cond = self.clock.condition()
+        self._chunks = collections.deque()
+        self._open = False
+        if peer is None:
+            peer = LoopbackTransport(timeout, peer=self, clock=self.clock)
+            peer._open = True
+        self.peer = peer
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        with self._cond:
+            self._open = False
+            self._cond.notify_all()
+
+    def write(self, data: bytes) -> int:
+        if not self._open:
+            raise OSError('Transport Not Open')
+        self.peer._receive(bytes(data))
+        return len(data)
+
+    def _receive(self, data: bytes):
+        with self._cond:
+            self._chunks.append(data)
+            self._cond.notify_all()
+
+    def _read(self, timeout: float) -> bytes:
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._chunks or not self._open, max(timeout, 0))
+            data = b''.join(self._chunks)
+            self._chunks.clear()
+            return data
+
+
+def transport_open(url: str, baudrate: int = 9600, timeout: float = 1.0) -> Transport:
+    """
+    Create and open a transport from a URL.
+
+    Supported URLs:
+    serial:///dev/ttyUSB0 or a plain port name such as /dev/ttyUSB0 or COM3
+    pty:// - creates a new pseudo terminal pair
+    tcp://host:port
+    loop:// - in memory loopback
+
+    A serial port baud rate can be set with a query, for example
+    serial:///dev/ttyUSB0?baudrate=19200
+
+    Raises OSError if the transport can't be opened.
+    """
+    transport = transport_create(url, baudrate, timeout)
+    transport.open()
+    return transport
+
+
+def transport_create(url: str, baudrate: int = 9600, timeout: float = 1.0,
+                     clock: Clock = None) -> Transport:
+    """
+    Create a transport from a URL without opening it.  A clock other than
+    the real time clock is only supported by the loop:// transport.
+    """
+    from urllib.parse import urlsplit, parse_qs
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    # Single letter schemes are Windows drive letters, not URLs.
+    if len(scheme) <= 1:
+        return SerialTransport(url, baudrate, timeout)
+    if scheme == 'serial':
+        query = parse_qs(parts.query)
+        if 'baudrate' in query:
+            baudrate = int(query['baudrate'][0])
+        return SerialTransport(parts.netloc + parts.path, baudrate, timeout)
+    if scheme == 'pty':
+        return PtyTransport(timeout)
+    if scheme == 'tcp':
+        if not parts.hostname or parts.port is None:
+            raise ValueError(f'Invalid TCP Transport URL: {url}')
+        return SocketTransport(parts.hostname, parts.port, timeout)
+    if scheme == 'loop':
+        return LoopbackTransport(timeout, clock=clock)
+    raise ValueError(f'Unsupported Transport URL: {url}')
@@ -1,6 +1,4 @@
 import time
-# pyserial (not serial)
-import serial
 import threading
 from threading import Thread
 
@@ -11,6 +9,33 @@ except ImportError:
 
 from lv5250 import *
 from lv5250.arm import *
+from lv5250.arm_link import *
+from lv5250.arm_metrics import *
+from lv5250.arm_clock import *
+from lv5250.arm_transport import *
+
+
+# Fixed commands which are sent repeatedly.  Their encoded bytes and message
+# class are cached so sending them doesn't allocate.
+FIXED_COMMANDS = ('GET POS', '?', 'STOP', 'REMOTE', 'TORQUE', 'FREE')
+
+_command_cache = {
+    command: (bytes('{}\r\n'.format(command), 'ascii'), msg_class_get(command))
+    for command in FIXED_COMMANDS}
+
+# Cache of single response lists.
+_resp_cache = {}
+
+
+def command_encode(command: str) -> bytes:
+    """
+    Returns the bytes to send for a command string including the line
+    ending.
+    """
+    cached = _command_cache.get(command)
+    if cached is not None:
+        return cached[0]
+    return bytes('{}\r\n'.format(command), 'ascii')
 
 
 class ArmMessage:
@@ -21,6 +46,10 @@ class ArmMessage:
     to sending and the results can be processed by the higher level code.
     """
 
+    __slots__ = ('_command', 'msg_class', 'timeout', 'resp', 'resp_ignore',
+                 'cb_start', 'cb_done', 'cb_other', 'cb_poll', 'poll_interval',
+                 'quiet', 'result', 'pool')
+
     def __init__(self,
                  command: str,
                  timeout=5,
@@ -28,11 +57,31 @@ class ArmMessage:
                  resp_ignore: str = None,
                  cb_start=None,
                  cb_done=None,
-                 cb_other=None):
+                 cb_other=None,
+                 msg_class: MsgClass = None,
+                 cb_poll=None,
+                 poll_interval: float = None,
+                 quiet: bool = False):
+        """
+        The command to send, stored as the bytes to write to the serial port.
+        Line endings are automatically added.
+        """
+        cached = _command_cache.get(command)
+        if cached is not None:
+            self._command = cached[0]
+        else:
+            self.command = command
+
         """
-        The command string to send. Line endings are automatically added.
+        The link scheduler message class.  The class is determined from the
+        command if not set.
         """
-        self.command = '{}\r\n'.format(command)
+        if msg_class is not None:
+            self.msg_class = MsgClass(msg_class)
+        elif cached is not None:
+            self.msg_class = cached[1]
+        else:
+            self.msg_class = msg_class_get(command)
 
         """
         The maximuim time to wait in seconds for a matching response before
@@ -50,7 +99,11 @@ class ArmMessage:
         """
         if type(resp) is str:
             # create single entry list if string was supplied
-            self.resp = [resp]
+            resp_list = _resp_cache.get(resp)
+            if resp_list is None:
+                resp_list = (resp,)
+                _resp_cache[resp] = resp_list
+            self.resp = resp_list
         else:
             self.resp = resp
 
@@ -83,127 +136,674 @@ class ArmMessage:
         """
         self.cb_other = cb_other
 
+        """
+        Function to call with each position response while the message is
+        polling, see poll_interval.  Returning True completes the message,
+        the done callback is made with the position response.
+        Has the form of callback(message : ArmMessage, response : str) -> bool
+        """
+        self.cb_poll = cb_poll
+
+        """
+        The time between position polls while waiting for the response
+        (seconds) or None to not poll.  Only used if cb_poll is set, the
+        timeout is then the maximuim time for the whole command rather than
+        the time to wait for each response.
+        """
+        self.poll_interval = poll_interval
+
+        """
+        Don't print the anticipated response, such as for the polls and
+        link checks which would otherwise print a line each time.
+        """
+        self.quiet = quiet
+
+        """
+        The outcome of the message, set before the done callback is made.
+        See MsgResult.
+        """
+        self.result = None
+
+        """
+        The pool the message was acquired from or None.
+        """
+        self.pool = None
+
+    @property
+    def command(self) -> bytes:
+        """
+        Get the command bytes to send including the line ending or None if
+        the command will be set by the start callback.
+        """
+        return self._command
+
+    @command.setter
+    def command(self, command):
+        """
+        Set the command to send from a string or bytes.  Line endings are
+        added if not already present.
+        """
+        if command is None:
+            self._command = None
+        elif isinstance(command, bytes):
+            if not command.endswith(b'\r\n'):
+                command += b'\r\n'
+            self._command = command
+        elif command.endswith('\r\n'):
+            self._command = bytes(command, 'ascii')
+        else:
+            self._command = command_encode(command)
+
+
+class ArmMessagePool:
+    """
+    Free List of Reusable Arm Messages
+
+    Messages acquired from the pool are re-initialized in place so the
+    repeated fixed commands don't allocate a new message object.  The
+    owner of a message must release it once the message's final callback
+    has been made.
+
+    Parameters:
+    msg_type: The ArmMessage class or subclass to create.
+    size: The maximuim number of free messages to keep.
+    """
+
+    def __init__(self, msg_type=ArmMessage, size: int = 16):
+        self._msg_type = msg_type
+        self._size = int(size)
+        self._free = []
+
+    def acquire(self, **kwargs) -> ArmMessage:
+        """
+        Returns a message initialized with the keyword arguments.
+        """
+        try:
+            message = self._free.pop()
+        except IndexError:
+            message = self._msg_type.__new__(self._msg_type)
+        message.__init__(**kwargs)
+        message.pool = self
+        return message
+
+    def release(self, message: ArmMessage):
+        """
+        Return a message to the pool.
+        """
+        if message.pool is self:
+            message.pool = None
+            if len(self._free) < self._size:
+                self._free.append(message)
+
+
+# Sentinel put on the response queue to end the wait for a response when
+# the link is lost.
+_LINK_LOST = object()
+
+# Sentinel put on the response queue to end the wait for the response of a
+# message interrupted by tx_urgent().
+_ABORT = object()
+
 
 class ArmUART:
+    """
+    Arm Serial Link
+
+    The link is supervised by a connection state machine.  The transport is
+    opened and the Arm probed with a REMOTE command before the link is
+    CONNECTED.  While connected a heartbeat is sent whenever the link has
+    been idle for HEARTBEAT_INTERVAL so a silent link is detected quickly.
+    When the link is lost the transport is closed, the message waiting for
+    a response is completed with a None response, and the transport is
+    reopened with an increasing backoff.  Queued messages are kept and sent
+    once the link is reconnected.
 
-    def __init__(self, port):
+    A message with a poll callback polls the position while it waits so
+    commands without a completion response, such as opening the Gripper,
+    can be completed as soon as the callback detects the motion has ended.
+
+    Parameters:
+    port: The port name or transport URL, see transport_open().
+    budgets: Optional dictionary of MsgClass to link capacity fraction which
+    overrides the default link scheduler budgets.
+    metrics: Optional registry to record the link metrics in.
+    state_cb: Optional function of the form callback(state :
+    ArmConnectionState) called on the link thread when the connection state
+    changes.  When the link connects it is called before queued messages
+    are sent so it can resync the session by calling tx_msg() directly.
+    clock: Optional clock for the timeouts and sleeps, such as a SimClock.
+    """
+
+    # Idle time before a heartbeat is sent (seconds)
+    HEARTBEAT_INTERVAL = 0.25
+    # The maximuim time to wait for the heartbeat response (seconds)
+    HEARTBEAT_TIMEOUT = 0.3
+    # The heartbeat command and its anticipated response.
+    HEARTBEAT_COMMAND = ('GET POS', 'P')
+    # The command sent to probe the Arm when the link is opened and its
+    # anticipated response.
+    PROBE_COMMAND = ('REMOTE', '>OK')
+    # The maximuim time to wait for the probe response (seconds)
+    PROBE_TIMEOUT = 1.0
+    # The command sent to poll the position while a message with a poll
+    # callback is waiting and its response.
+    POLL_COMMAND = ('GET POS', 'P')
+    # The maximuim time to wait for an outstanding poll response after the
+    # message completes (seconds)
+    POLL_TIMEOUT = 1.0
+
+    # The reconnect backoff limits (seconds)
+    RECONNECT_MIN = 0.05
+    RECONNECT_MAX = 2.0
+
+    def __init__(self, port, budgets: dict = None, metrics: MetricsRegistry = None,
+                 state_cb=None, clock: Clock = None):
+
+        self.clock = clock = clock or REAL_CLOCK
 
         # Que of responses received over the the serial link
-        self.resps = queue.Queue()
+        self.resps = clock.queue()
 
         # Lock for ensuring exclusive Serial transmission accesss
         self.tx_lock = threading.Lock()
 
-        # Que of messages to be sent.
-        self.messages = queue.Queue()
+        # Scheduler for the messages to be sent.
+        self.messages = LinkScheduler(baudrate=9600, budgets=budgets, clock=clock)
+
+        # Link metrics
+        self.metrics = LinkMetrics(metrics or MetricsRegistry(), self.messages)
+
+        # The connection state and the function to call when it changes.
+        self.state = ArmConnectionState.UNKNOWN
+        self._state_cb = state_cb
+        # Set while the transport is open, the rx thread reads.
+        self._open = clock.event()
+        # Set while the link is connected, the tx thread sends.
+        self._connected = clock.event()
+        # Set when the link is lost.
+        self._lost = clock.event()
+        # Incremented each time the transport is closed so errors from a
+        # previous connection are ignored.
+        self._generation = 0
+        # The time of the most recent link activity.
+        self._activity = self.clock.monotonic()
+        # Set by close() to stop reconnecting.
+        self._closed = False
+        # Lock for the transport writes, tx_urgent() writes while a message
+        # is waiting for its response.
+        self._write_lock = threading.Lock()
+        # The sequence number of the message waiting for its response, 0
+        # if none, and of the message interrupted by tx_urgent().
+        self._sequence = 0
+        self._in_flight = 0
+        self._abort = 0
+        # The position polls of the waiting message without a response.
+        self._polls = 0
+        # The (response, expiry time, message) of responses to drop rather
+        # than pass to the waiting message, such as the response to an
+        # urgent command.  The message is set for the late response of a
+        # message which completed early.
+        self._discard = []
+        self._discard_lock = threading.Lock()
 
         # Thread for reading responses over the serial port
-        self.rx_thread = threading.Thread(
-                target=self._rx_loop, daemon=True)
+        self.rx_thread = clock.thread(self._rx_loop)
 
         # Thread for Writing messages to the serial port
-        self.tx_thread = threading.Thread(target=self._tx_loop, daemon=True)
-
-        self.serial = serial.Serial(port=port, baudrate=9600)
-        self.serial.bytesize = serial.EIGHTBITS
-        self.serial.parity = serial.PARITY_NONE
-        self.serial.stopbits = serial.STOPBITS_ONE
-        self.serial.xonxoff = False
-        self.serial.rtscts = False
-        self.serial.dsrdtr = False
-        self.serial.exclusive = False
-        self.serial.timeout = 1.0
-        self.serial.write_timeout = 5.0
-        self.serial.inter_byte_timeout = 0.1
-        # close the port if already open
-        if self.serial.isOpen:
-            self.serial.close()
-        try:
-            self.serial.open()
-        except serial.SerialException as e:
-            print("Error Openning Port: " + str(e))
-        else:
-            print("Port Open")
-            self.resps.queue.clear()
-            self.messages.queue.clear()
-            self.rx_thread.start()
-            self.tx_thread.start()
+        self.tx_thread = clock.thread(self._tx_loop)
+
+        # Thread for the connection state machine.
+        self.link_thread = clock.thread(self._link_loop)
+
+        # The connection to the Arm, a plain port name is a serial port.
+        self.transport = transport_create(port, baudrate=9600, timeout=1.0,
+                                          clock=clock)
+        self.rx_thread.start()
+        self.tx_thread.start()
+        self.link_thread.start()
 
     # Function for adding a message to the message que
     def tx_msg_enque(self, message: ArmMessage):
         self.messages.put(message)
         #print(self.messages.count)
 
+    def link_stats(self) -> dict:
+        """
+        Returns the serial link utilisation statistics.
+        """
+        return self.messages.stats()
+
+    def close(self):
+        """
+        Close the link.  The link isn't reconnected after it's closed.
+        """
+        self._closed = True
+        self._lost.set()
+        self.resps.put(_LINK_LOST)
+        self.link_thread.join(timeout=2.0)
+
+    def tx_urgent(self, command: str, resp: str = '>OK', timeout: float = 2.0) -> bool:
+        """
+        Send a command immediately, ahead of the queued messages and without
+        waiting for the message being sent to complete.  Intended for STOP
+        commands which can't wait for a long motion command's response.  The
+        message waiting for its response is completed with a None response
+        since the command interrupts it, and the urgent command's response
+        is dropped.  A STOP also cancels the queued motion messages.  Returns
+        False if the command couldn't be written.
+
+        Parameters:
+        command: The command to send.
+        resp: The anticipated response to drop.
+        timeout: The maximuim time to wait for the response to drop
+        (seconds)
+        """
+        data = command_encode(command)
+        if msg_class_get(command) == MsgClass.STOP:
+            self.messages.motion_cancel()
+            self._discard_clear()
+        try:
+            with self._write_lock:
+                self.transport.write(data)
+        except OSError as e:
+            print("Error Writing Port: " + str(e))
+            self._link_lost(str(e))
+            return False
+        self._activity = self.clock.monotonic()
+        self.messages.tx_record(MsgClass.STOP, len(data))
+        self.metrics.sent.inc(command_type(data))
+        self.metrics.tx_bytes.inc(amount=len(data))
+        if resp:
+            self._discard_add(resp, self._activity + timeout)
+        in_flight = self._in_flight
+        if in_flight:
+            self._abort = in_flight
+            self.resps.put(_ABORT)
+        return True
+
+    def _discard_add(self, resp: str, expiry: float,
+                     message: ArmMessage = None):
+        """
+        Drop the next response starting with resp received before the
+        expiry time.  The entry is tied to the message if set, see
+        _discard_clear().
+        """
+        with self._discard_lock:
+            self._discard.append((resp, expiry, message))
+
+    def _discard_clear(self, resps: list[str] = None):
+        """
+        Remove the entries tied to the messages which completed early, only
+        those for the responses if set.  Called when a STOP or the next
+        move is sent since the Arm doesn't send the earlier move's >END
+        once it's stopped or superseded, and the entry would drop the new
+        move's >END.
+        """
+        with self._discard_lock:
+            self._discard = [entry for entry in self._discard
+                             if entry[2] is None
+                             or (resps is not None and entry[0] not in resps)]
+
+    def _discarded(self, line: str) -> bool:
+        """
+        Is the response one to drop?  Expired entries are removed.
+        """
+        now = self.clock.monotonic()
+        dropped = False
+        with self._discard_lock:
+            remaining = []
+            for entry in self._discard:
+                resp, expiry, _ = entry
+                if expiry < now:
+                    continue
+                if not dropped and line.startswith(resp):
+                    dropped = True
+                    continue
+                remaining.append(entry)
+            self._discard = remaining
+        return dropped
+
+    def _state_set(self, state: ArmConnectionState):
+        self.state = state
+        self.metrics.connected.set(
+            1 if state == ArmConnectionState.CONNECTED else 0)
+        if callable(self._state_cb):
+            self._state_cb(state)
+
+    def _link_lost(self, reason: str, generation: int = None):
+        """
+        Report the link as lost.  Called from any thread, the link thread
+        closes the transport and reconnects.
+        """
+        if generation is not None and generation != self._generation:
+            # An error from a previous connection.
+            return
+        if not self._lost.is_set():
+            print("Link Lost: " + reason)
+            self._lost.set()
+            # End the wait for a response.
+            self.resps.put(_LINK_LOST)
+
+    def _connect(self) -> bool:
+        """
+        Open the transport and probe the Arm.  Returns True if the Arm
+        responded.
+        """
+        try:
+            self.transport.open()
+            # clear out the rx buffer before starting
+            self.transport.read_all()
+        except OSError as e:
+            print("Error Openning Port: " + str(e))
+            return False
+        print("Port Open")
+        self._lost.clear()
+        self.resps.queue.clear()
+        self._open.set()
+        command, resp = self.PROBE_COMMAND
+        if self._link_check(command, resp, self.PROBE_TIMEOUT, blocking=True):
+            return True
+        self._disconnect()
+        return False
+
+    def _disconnect(self):
+        self._connected.clear()
+        self._open.clear()
+        self._generation += 1
+        try:
+            self.transport.close()
+        except OSError as e:
+            print("Error Closing Port: " + str(e))
+
+    def _link_check(self, command: str, resp: str, timeout: float,
+                    blocking: bool = False) -> bool:
+        """
+        Send a command and return True if the anticipated response is
+        received.  Returns True without sending if another message is being
+        sent and blocking is False since the link is in use.
+        """
+        if not self.tx_lock.acquire(blocking):
+            return True
+        result = [None]
+
+        def done_cb(message, line):
+            result[0] = line
+
+        try:
+            # The link checks aren't printed, the heartbeat would print a
+            # response each HEARTBEAT_INTERVAL.
+            self._tx_msg(ArmMessage(command=command,
+                                    resp=resp,
+                                    timeout=timeout,
+                                    cb_done=done_cb,
+                                    quiet=True))
+        finally:
+            self.tx_lock.release()
+        return result[0] is not None
+
+    # Connection state machine loop
+    def _link_loop(self):
+        backoff = self.RECONNECT_MIN
+        lost_time = None
+        while not self._closed:
+            if not self._connected.is_set():
+                attempt = self.clock.monotonic()
+                if not self._connect():
+                    if self.state != ArmConnectionState.DISCONNECTED:
+                        self._state_set(ArmConnectionState.DISCONNECTED)
+                    self.clock.sleep(backoff)
+                    backoff = min(backoff * 2, self.RECONNECT_MAX)
+                    continue
+                backoff = self.RECONNECT_MIN
+                now = self.clock.monotonic()
+                if lost_time is not None:
+                    self.metrics.reconnect.observe(now - attempt)
+                    self.metrics.outage.observe(now - lost_time)
+                # Resync before the queued messages are sent.
+                self._state_set(ArmConnectionState.CONNECTED)
+                self._activity = self.clock.monotonic()
+                self._connected.set()
+                continue
+
+            if self._lost.is_set():
+                lost_time = self.clock.monotonic()
+                self.metrics.disconnects.inc()
+                self._disconnect()
+                self._state_set(ArmConnectionState.DISCONNECTED)
+                continue
+
+            idle = self.clock.monotonic() - self._activity
+            if idle < self.HEARTBEAT_INTERVAL:
+                self._lost.wait(self.HEARTBEAT_INTERVAL - idle)
+                continue
+            if self.tx_lock.locked():
+                # A message is waiting for its response, a lost link ends
+                # the wait with a None response.
+                self._lost.wait(self.HEARTBEAT_INTERVAL)
+                continue
+            command, resp = self.HEARTBEAT_COMMAND
+            if not self._link_check(command, resp, self.HEARTBEAT_TIMEOUT):
+                self._link_lost("Heartbeat Timeout")
+        self._disconnect()
+        self._state_set(ArmConnectionState.DISCONNECTED)
+
     # loop for adding serial messages to the responses que
     def _rx_loop(self):
-        # clear out the rx buffer before starting
-        self.serial.read_all()
-        while self.serial.isOpen:
-            line = self.serial.readline()
+        while True:
+            if not self._open.wait(0.5):
+                continue
+            generation = self._generation
+            try:
+                line = self.transport.readline()
+            except OSError as e:
+                if generation == self._generation:
+                    print("Error Reading Port: " + str(e))
+                self._link_lost(str(e), generation)
+                self.clock.sleep(self.RECONNECT_MIN)
+                continue
+            if len(line) > 0:
+                self._activity = self.clock.monotonic()
+                self.messages.rx_record(len(line))
+                self.metrics.rx_bytes.inc(amount=len(line))
+            elif not self.transport.is_open:
+                self._link_lost("Port Closed", generation)
+                self.clock.sleep(self.RECONNECT_MIN)
+                continue
             # Remove the line endings and leading / trailing spaces
             line = line.replace(b'\n', b'')
             line = line.replace(b'\r', b'')
             line = line.strip()
             # convert the bytes to a string
-            line_str = line.decode('ascii')
+            line_str = line.decode('ascii', 'replace')
             #print(line)
             if len(line_str) > 0:
                 self.resps.put(line_str)
-            time.sleep(0.1)
 
     # loop for transmitting messages from the messages que
     def _tx_loop(self):
-        while self.serial.isOpen:
+        while True:
+            # Queued messages are kept while the link is disconnected.
+            if not self._connected.wait(0.5):
+                continue
             try:
                 message = self.messages.get(block=True, timeout=0.5)
-                self.tx_msg(message)
             except queue.Empty:
-                time.sleep(0.1)
-            except all as e:
-                print(e)
-        # Empty the Messages Queue on Disconnect.
-        self.messages.queue.clear()
+                continue
+            # Hold the message if the link was lost while waiting for it.
+            while not self._connected.wait(0.5):
+                if self._closed:
+                    return
+            self.tx_msg(message)
 
     # Function for sending a single message over the serial port.
     # Note that the function blocks.
     def tx_msg(self, message: ArmMessage):
         with self.tx_lock:
-            # Make the start callback and overwrite the message with the one
-            # that's returned.
-            if callable(message.cb_start):
-                message = message.cb_start(message)
-            if message:
-                # Convert the command string to bytes and send
-                self.serial.write(bytes(message.command, 'ascii'))
-                while True:
-                    try:
-                        line = self.resps.get(timeout=message.timeout)
-
-                        if message.resp_ignore and line.startswith(message.resp_ignore):
-                            # The Ignore response received, check the next response.
-                            #print(f'Ignore Response {line} Received')
-                            pass
-                        elif message.resp:
-                            for resp_str in message.resp:
-                                if line.startswith(resp_str):
-                                    # The correct response was received
-                                    print(
-                                        f'Anticipated Response {line} Receieved')
-                                    if callable(message.cb_done):
-                                        message.cb_done(message, line)
-                                    return
-                            # The response didn't match the anticipated
-                            # response, check the next responnse.
-                            if callable(message.cb_other):
-                                message.cb_other(message, line)
-                        else:
-                            # No anticipated response was set so return after
-                            # the first response is received.
+            self._tx_msg(message)
+
+    def _tx_msg(self, message: ArmMessage):
+        # Make the start callback and overwrite the message with the one
+        # that's returned.
+        if callable(message.cb_start):
+            message = message.cb_start(message)
+        if message:
+            # Send the pre-encoded command bytes.
+            command = message.command
+            metrics = self.metrics
+            command_name = command_type(command)
+            if self._discard:
+                if message.msg_class == MsgClass.STOP:
+                    self._discard_clear()
+                elif message.resp:
+                    self._discard_clear(message.resp)
+            try:
+                with self._write_lock:
+                    self.transport.write(command)
+            except OSError as e:
+                print("Error Writing Port: " + str(e))
+                self._link_lost(str(e))
+                metrics.timeouts.inc(command_name)
+                message.result = MsgResult.TIMEOUT
+                if callable(message.cb_done):
+                    message.cb_done(message, None)
+                return
+            start = self.clock.monotonic()
+            self._activity = start
+            self.messages.tx_record(message.msg_class, len(command))
+            metrics.sent.inc(command_name)
+            metrics.tx_bytes.inc(amount=len(command))
+            self._sequence += 1
+            self._in_flight = sequence = self._sequence
+            try:
+                self._tx_wait(message, sequence, command_name, start)
+            finally:
+                self._in_flight = 0
+                if self._polls:
+                    # Drop the responses to the polls which are still
+                    # outstanding rather than pass them to the next message.
+                    expiry = self.clock.monotonic() + self.POLL_TIMEOUT
+                    for _ in range(self._polls):
+                        self._discard_add(self.POLL_COMMAND[1], expiry)
+                    self._polls = 0
+
+    def _tx_wait(self, message: ArmMessage, sequence: int, command_name: str,
+                 start: float):
+        # Wait for the message's anticipated response.
+        metrics = self.metrics
+        clock = self.clock
+        poll_interval = message.poll_interval if callable(message.cb_poll) else None
+        if poll_interval:
+            # The timeout covers the whole command since the polls keep the
+            # responses coming.
+            deadline = start + message.timeout
+            next_poll = start + poll_interval
+            poll_resp = self.POLL_COMMAND[1]
+        result = MsgResult.TIMEOUT
+        while True:
+            try:
+                timeout = message.timeout
+                if poll_interval:
+                    now = clock.monotonic()
+                    if now >= deadline:
+                        raise queue.Empty
+                    if now >= next_poll:
+                        if not self._poll_send():
+                            raise queue.Empty
+                        self._polls += 1
+                        next_poll = now + poll_interval
+                    timeout = min(deadline, next_poll) - now
+                try:
+                    line = self.resps.get(timeout=timeout)
+                except queue.Empty:
+                    if poll_interval:
+                        # Time for the next poll.
+                        continue
+                    raise
+                if line is _LINK_LOST:
+                    # The link was lost while waiting.
+                    raise queue.Empty
+                if line is _ABORT:
+                    if self._abort != sequence:
+                        # Left over from an earlier message.
+                        continue
+                    # Interrupted by an urgent command.
+                    result = MsgResult.CANCELLED
+                    raise queue.Empty
+                if self._discard and self._discarded(line):
+                    continue
+                # Include the removed line ending.
+                self.messages.resp_record(
+                    message.msg_class, len(line) + 2)
+
+                if poll_interval and line.startswith(poll_resp):
+                    self._polls = max(self._polls - 1, 0)
+                    if message.cb_poll(message, line):
+                        # Completed before the anticipated response, drop
+                        # it if it arrives before the timeout so the link
+                        # is released now.
+                        if message.resp:
+                            self._discard_add(message.resp[0], deadline, message)
+                        metrics.latency.observe(
+                            clock.monotonic() - start, command_name)
+                        message.result = MsgResult.COMPLETED
+                        if callable(message.cb_done):
+                            message.cb_done(message, line)
+                        return
+                elif message.resp_ignore and line.startswith(message.resp_ignore):
+                    # The Ignore response received, check the next response.
+                    #print(f'Ignore Response {line} Received')
+                    pass
+                elif message.resp:
+                    for resp_str in message.resp:
+                        if line.startswith(resp_str):
+                            # The correct response was received
+                            if not message.quiet:
+                                print(
+                                    f'Anticipated Response {line} Receieved')
+                            metrics.latency.observe(
+                                clock.monotonic() - start, command_name)
+                            message.result = MsgResult.COMPLETED
                             if callable(message.cb_done):
                                 message.cb_done(message, line)
                             return
-                    except queue.Empty:
-                        # no response was received before the timeout expired
-                        if callable(message.cb_done):
-                            message.cb_done(message, None)
-                        return
+                    # The response didn't match the anticipated
+                    # response, check the next responnse.
+                    if callable(message.cb_other):
+                        message.cb_other(message, line)
+                else:
+                    # No anticipated response was set so return after
+                    # the first response is received.
+                    metrics.latency.observe(
+                        clock.monotonic() - start, command_name)
+                    message.result = MsgResult.COMPLETED
+                    if callable(message.cb_done):
+                        message.cb_done(message, line)
+                    return
+            except queue.Empty:
+                # no response was received before the timeout expired, or
+                # the message was interrupted.
+                if result == MsgResult.TIMEOUT:
+                    metrics.timeouts.inc(command_name)
+                message.result = result
+                if callable(message.cb_done):
+                    message.cb_done(message, None)
+                return
+
+    def _poll_send(self) -> bool:
+        """
+        Write a position poll for the message waiting for its response.
+        Returns False if the poll couldn't be written.
+        """
+        data = command_encode(self.POLL_COMMAND[0])
+        try:
+            with self._write_lock:
+                self.transport.write(data)
+        except OSError as e:
+            print("Error Writing Port: " + str(e))
+            self._link_lost(str(e))
+            return False
+        self._activity = self.clock.monotonic()
+        self.messages.tx_record(MsgClass.TELEMETRY, len(data))
+        self.metrics.sent.inc(command_type(data))
+        self.metrics.tx_bytes.inc(amount=len(data))
+        return True
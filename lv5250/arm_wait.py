@@ -0,0 +1,124 @@
+from lv5250 import *
+from lv5250.arm_clock import *
+from lv5250.axis import *
+from lv5250.arm_snapshot import *
+
+
+class WaitPredicate:
+    """
+    ArmManager.wait_until() Predicate Base Class
+
+    A predicate is called with each new ArmSnapshot, and periodically while
+    waiting, and returns True once its condition is met.  Any callable
+    taking a snapshot can be used as a predicate, subclasses can set
+    poll_cmd to select the ArmManager command used to request new samples.
+    """
+
+    # The ArmManager command used to poll for samples while waiting.
+    poll_cmd = 'get_pos_cmd'
+
+    # The clock, set to the ArmManager's clock by wait_until().
+    clock = REAL_CLOCK
+
+    def __call__(self, snapshot: ArmSnapshot) -> bool:
+        raise NotImplementedError
+
+
+class AxisWithin(WaitPredicate):
+    """
+    True once an axis position is within a tolerance of a target.
+
+    Parameters:
+    axis: The axis to check.
+    target: The target position (encoder counts)
+    tolerance: The allowed distance from the target (encoder counts)
+    """
+
+    def __init__(self, axis: AxisType, target: int, tolerance: int = 50):
+        self.index = AxisType(axis).value
+        self.target = int(target)
+        self.tolerance = abs(int(tolerance))
+
+    def __call__(self, snapshot: ArmSnapshot) -> bool:
+        return abs(snapshot.position[self.index] - self.target) <= self.tolerance
+
+
+class LimitSet(WaitPredicate):
+    """
+    True once an axis limit switch bit is set.  The limit bits are reported
+    by the status command so it is used to poll.
+
+    Parameters:
+    axis: The axis whose limit switch to check.
+    """
+
+    poll_cmd = 'get_status_cmd'
+
+    def __init__(self, axis: AxisType):
+        self.mask = 1 << AxisType(axis).value
+
+    def __call__(self, snapshot: ArmSnapshot) -> bool:
+        return bool(snapshot.limits & self.mask)
+
+
+class PositionStable(WaitPredicate):
+    """
+    True once the position has stayed within a tolerance for a duration.
+
+    Parameters:
+    duration: How long the position must be stable (milliseconds)
+    tolerance: The allowed movement while stable (encoder counts)
+    axes: Optional AxisTypes to check, defaults to all of the axises.
+    """
+
+    def __init__(self, duration: float = 500, tolerance: int = 0, axes=None):
+        self.duration = float(duration) / 1000
+        self.tolerance = abs(int(tolerance))
+        if axes is None:
+            self.indexes = tuple(range(6))
+        else:
+            self.indexes = tuple(AxisType(axis).value for axis in axes)
+        self._reference = None
+        self._since = 0.0
+
+    def __call__(self, snapshot: ArmSnapshot) -> bool:
+        now = self.clock.monotonic()
+        position = snapshot.position
+        reference = self._reference
+        if reference is None or any(
+                abs(position[index] - reference[index]) > self.tolerance
+                for index in self.indexes):
+            # Moved, restart the stable period from this position.
+            self._reference = position
+            self._since = now
+            return False
+        return now - self._since >= self.duration
+
+
+class GripperStalled(PositionStable):
+    """
+    True once the Gripper has stopped moving for a duration, for example
+    while closing on an object or at the end of its travel.
+
+    Parameters:
+    duration: How long the Gripper must be stopped (milliseconds)
+    tolerance: The allowed Gripper movement while stopped (encoder counts)
+    require_motion: Only report a stall after the Gripper has been seen
+    moving, so a wait started before the Gripper command takes effect
+    doesn't return immediately.
+    """
+
+    def __init__(self, duration: float = 200, tolerance: int = 10,
+                 require_motion: bool = True):
+        super().__init__(duration, tolerance, axes=(AxisType.GRIPPER,))
+        self.require_motion = require_motion
+        self._start = None
+
+    def __call__(self, snapshot: ArmSnapshot) -> bool:
+        stable = super().__call__(snapshot)
+        if self._start is None:
+            self._start = snapshot.position.gripper
+        if self.require_motion:
+            if abs(snapshot.position.gripper - self._start) <= self.tolerance:
+                return False
+        return stable
@@ -156,23 +156,25 @@ class Axis:
         """
         self._sw_cnt_min = limit
 
-    def cnt_limit(self, counts: int) -> int:
+    def cnt_limit(self, counts: int, quiet: bool = False) -> int:
         """
         Function for limiting an encoder count value to be within the
         configured software and hardware limits.  Returns the limited
-        encoder count value.
+        encoder count value.  The limiting is printed unless quiet is set.
         """
         counts = int(counts)
         counts_max = self.cnt_max()
         counts_min = self.cnt_min()
         #print(f'Cnts: {counts}  Min: {counts_min}, Max: {counts_max}')
         if counts_max is not None and counts > counts_max:
-            print('{} Counts Limited to {} Counts'.format(
-                counts, counts_max))
+            if not quiet:
+                print('{} Counts Limited to {} Counts'.format(
+                    counts, counts_max))
             return counts_max
         elif counts_min is not None and counts < counts_min:
-            print('{} Counts Limited to {} Counts'.format(
-                counts, counts_min))
+            if not quiet:
+                print('{} Counts Limited to {} Counts'.format(
+                    counts, counts_min))
             return counts_min
         else:
             return counts
@@ -197,6 +199,22 @@ class Axis:
             # Make the counts updated call back
             self._cb_update()
 
+    def counts_resolve(self, counts: int, quiet: bool = False) -> int:
+        """
+        Returns the encoder count value constrained to the axis limits
+        without changing the axis position.  The limiting is printed unless
+        quiet is set.
+        """
+        return self.cnt_limit(counts, quiet)
+
+    def counts_store(self, counts: int):
+        """
+        Store an already constrained axis position in units of encoder
+        counts without making the update callback.  Used by the batched
+        Axises.counts_set() which resolves the dependent axises itself.
+        """
+        self._counts = int(counts)
+
 
 class RotaryAxis(Axis):
     """
@@ -367,37 +385,41 @@ class RotaryAxisRelative(RotaryAxis):
         self._rel_angle_min = rel_angle_min
         self._rel_angle_max = rel_angle_max
 
-    def assoc_angle_limit(self, angle: float) -> float:
+    def assoc_angle_limit(self, angle: float, quiet: bool = False) -> float:
         """
         Function for constraining a ground referenced axis angle to the
-        the relative angle limits.
+        the relative angle limits.  The limiting is printed unless quiet is
+        set.
 
         """
         if callable(self._rel_angle_func):
             # Get the ground referenced angle for the associated axis.
             assoc_axis_angle = float(self._rel_angle_func())
             if assoc_axis_angle is None:
-                print('Associated Angle Function Returned None')
+                if not quiet:
+                    print('Associated Angle Function Returned None')
                 # return the orignal angle
                 return angle
             # Calculate the angle between the associated axis and the axis.
             relative_angle = assoc_axis_angle - angle
             if self._rel_angle_max is not None and relative_angle > self._rel_angle_max:
                 # The relative angle between the associated axis and the axis exceeded the max limit.
-                print(
-                    f'Axis Command {angle:0.1f}, Associated Axis {assoc_axis_angle:0.1f}, Relative Angle: {relative_angle:0.1f} degs')
                 return_angle = assoc_axis_angle - self._rel_angle_max
-                print(
-                    f'Axis Command {angle:0.1f} deg limited to {return_angle:0.1f} deg to meet the {self._rel_angle_max:0.1f} deg constraint.')
+                if not quiet:
+                    print(
+                        f'Axis Command {angle:0.1f}, Associated Axis {assoc_axis_angle:0.1f}, Relative Angle: {relative_angle:0.1f} degs')
+                    print(
+                        f'Axis Command {angle:0.1f} deg limited to {return_angle:0.1f} deg to meet the {self._rel_angle_max:0.1f} deg constraint.')
                 return return_angle
             elif self._rel_angle_min is not None and relative_angle < self._rel_angle_min:
                 # The relative angle between the associated axis and the axis
                 # was less than the min limit.
-                print(
-                    f'Axis {angle:0.1f}, Associated Axis Angle {assoc_axis_angle:0.1f}, Relative Angle: {relative_angle:0.1f} degs')
                 return_angle = assoc_axis_angle - self._rel_angle_min
-                print(
-                    f'Axis {angle:0.1f} deg limited to {return_angle:0.1f} deg to meet the {self._rel_angle_min:0.1f} deg constraint.')
+                if not quiet:
+                    print(
+                        f'Axis {angle:0.1f}, Associated Axis Angle {assoc_axis_angle:0.1f}, Relative Angle: {relative_angle:0.1f} degs')
+                    print(
+                        f'Axis {angle:0.1f} deg limited to {return_angle:0.1f} deg to meet the {self._rel_angle_min:0.1f} deg constraint.')
                 return return_angle
             else:
                 return angle
@@ -405,6 +427,20 @@ class RotaryAxisRelative(RotaryAxis):
             # print('Associated Angle Function Not Callable')
             return angle
 
+    def counts_resolve(self, counts: int, quiet: bool = False) -> int:
+        """
+        Returns the encoder count value constrained to the relative angle
+        limits, using the associated axis's current angle, and the count
+        limits without changing the axis position.  The limiting is printed
+        unless quiet is set.
+        """
+        counts = int(counts)
+        angle = self.cnt_to_angle(counts)
+        limited = self.assoc_angle_limit(angle, quiet)
+        if limited != angle:
+            counts = self.angle_to_cnt(limited)
+        return self.cnt_limit(counts, quiet)
+
     def update(self):
         """
         Update the axis angle after making the associated axis relative angle
@@ -90,6 +90,50 @@ class Axises:
                 ArmConfig.BASE_SCALE,
                 ArmConfig.BASE_OFFSETT_DEG, None, None)
 
+    def counts_get(self) -> tuple:
+        """
+        Returns the axis positions in encoder counts as a (gripper,
+        wrist_roll, wrist_pitch, elbow, shoulder, base) tuple.
+        """
+        return (self.gripper.counts,
+                self.wrist_roll.counts,
+                self.wrist_pitch.counts,
+                self.elbow.counts,
+                self.shoulder.counts,
+                self.base.counts)
+
+    def counts_set(self, counts: tuple, quiet: bool = False) -> None:
+        """
+        Set all of the axis positions at once.
+
+        The axises are resolved in a single pass in dependency order, the
+        Shoulder before the Elbow before the Wrist Pitch, so each relative
+        limit is checked once against the new position of the axis it
+        depends on.  The per axis update callbacks aren't made.  The result
+        doesn't depend on the previous positions.
+
+        Note this clamps differently to setting the axis counts one at a
+        time in (gripper, wrist_roll, wrist_pitch, elbow, shoulder, base)
+        order, which checks the Wrist Pitch and Elbow against the previous
+        Elbow and Shoulder positions.  Starting from the zero position the
+        pose (28405, 13385, -36166, 57122, -1590, 44432) gives a Wrist Pitch
+        of -23037 counts here but 15083 counts through the setters, about
+        1 in 7 random poses differ.  A pose within all of the limits is set
+        the same either way.
+
+        Parameters:
+        counts: The (gripper, wrist_roll, wrist_pitch, elbow, shoulder,
+        base) positions in encoder counts.
+        quiet: Don't print the limited positions.
+        """
+        gripper, wrist_roll, wrist_pitch, elbow, shoulder, base = counts
+        self.gripper.counts_store(self.gripper.counts_resolve(gripper, quiet))
+        self.wrist_roll.counts_store(self.wrist_roll.counts_resolve(wrist_roll, quiet))
+        self.base.counts_store(self.base.counts_resolve(base, quiet))
+        self.shoulder.counts_store(self.shoulder.counts_resolve(shoulder, quiet))
+        self.elbow.counts_store(self.elbow.counts_resolve(elbow, quiet))
+        self.wrist_pitch.counts_store(self.wrist_pitch.counts_resolve(wrist_pitch, quiet))
+
     def _shoulder_angle(self):
         """
         Returns the current ground referenced shoulder angle in degrees.
@@ -0,0 +1,516 @@
+import collections
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import Future
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from lv5250 import *
+from lv5250.arm_manager import *
+
+
+# Frame header, the payload length as a big endian uint32.
+FRAME_HEADER = struct.Struct('>I')
+
+# Maximuim frame payload size (bytes)
+FRAME_MAX = 65536
+
+# Axis names in the order used by the counts tuples.
+AXIS_NAMES = ('gripper', 'wrist_roll', 'wrist_pitch', 'elbow', 'shoulder',
+              'base')
+
+# ArmManager commands which can be requested by clients and their argument
+# names.  The commands complete when their callback is made.
+SERVER_COMMANDS = {
+    'get_pos_cmd': (),
+    'get_status_cmd': (),
+    'clear_estop_cmd': (),
+    'remote_cmd': (),
+    'stop_cmd': (),
+    'hard_home_cmd': (),
+    'free_cmd': (),
+    'torque_cmd': (),
+    'shutdown_cmd': (),
+    'gripper_close_cmd': ('speed', 'timeout'),
+    'gripper_open_cmd': ('speed', 'timeout'),
+    'move_to_cmd': ('speed', 'gripper', 'wrist_roll', 'wrist_pitch', 'elbow',
+                    'shoulder', 'base', 'in_position'),
+    'move_axis_cmd': ('axis', 'speed'),
+    'move_inc_cmd': ('axis', 'speed', 'counts'),
+    'move_to_limit_cmd': ('axis', 'speed'),
+}
+
+
+def frame_encode(payload: dict) -> bytes:
+    """
+    Encode a frame: the payload length followed by the compact JSON payload.
+    """
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+def frame_read(sock: socket.socket) -> dict:
+    """
+    Read a single frame.  Returns None if the connection was closed.
+    """
+    header = _recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > FRAME_MAX:
+        raise ValueError(f'Frame Too Large: {length}')
+    data = _recv_exact(sock, length)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+def _recv_exact(sock: socket.socket, count: int) -> bytes:
+    data = bytearray()
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def arm_dict(arm: ArmSnapshot) -> dict:
+    """
+    Convert an Arm Snapshot to a dictionary of position and command counts
+    by axis name.
+    """
+    return {
+        'position': dict(zip(AXIS_NAMES, arm.position)),
+        'command': dict(zip(AXIS_NAMES, arm.command)),
+    }
+
+
+def address_parse(url: str):
+    """
+    Parse a server URL.
+
+    Supported URLs:
+    tcp://host:port
+    unix:///path/to/socket
+
+    Returns:
+    A (family, address) tuple.
+    """
+    from urllib.parse import urlsplit
+    parts = urlsplit(url)
+    if parts.scheme == 'tcp':
+        if not parts.hostname or parts.port is None:
+            raise ValueError(f'Invalid Server URL: {url}')
+        return socket.AF_INET, (parts.hostname, parts.port)
+    if parts.scheme == 'unix':
+        return socket.AF_UNIX, parts.netloc + parts.path
+    raise ValueError(f'Unsupported Server URL: {url}')
+
+
+class ArmServerClient:
+    """
+    Arm Server Client Connection State
+
+    Each client has its own pending request queue and an outbox written by a
+    dedicated thread so a slow client never blocks the Arm link threads.
+    """
+
+    def __init__(self, server, sock: socket.socket, name: str):
+        self.server = server
+        self.sock = sock
+        self.name = name
+        # Requests waiting to be sent to the Arm.
+        self.pending = collections.deque()
+        # Number of requests sent to the Arm which haven't completed.
+        self.in_flight = 0
+        # Is the client subscribed to telemetry?
+        self.subscribed = False
+        # The last telemetry sent to the client.
+        self.telemetry = None
+        self.outbox = queue.Queue()
+        self.closed = False
+
+    def send(self, payload: dict):
+        """
+        Queue a frame to send to the client.
+        """
+        if not self.closed:
+            self.outbox.put(frame_encode(payload))
+
+    def writer_loop(self):
+        while True:
+            data = self.outbox.get()
+            if data is None:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                break
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.outbox.put(None)
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+
+class ArmServer:
+    """
+    Local Arm Server
+
+    Owns an ArmManager and shares it with many client processes over a
+    local TCP or Unix socket.
+
+    Frames are a big endian uint32 payload length followed by a compact JSON
+    payload.  Requests have the form {"id": 1, "op": "move_to_cmd",
+    "args": {...}} and are answered by {"id": 1, "arm": {...}} once the
+    command completes or {"id": 1, "error": "..."}.  Clients may have many
+    requests in flight at once.
+
+    Requests are admitted to the Arm link round robin between clients with
+    a limit on the number of each client's requests in flight so a chatty
+    client can't raise the latency for other clients.
+
+    Clients send {"id": 1, "op": "subscribe"} to receive telemetry frames of
+    the form {"telemetry": {"position": {"base": 100}}} which only contain
+    the values which changed since the last telemetry sent to the client.
+
+    Parameters:
+    manager: The ArmManager to share.
+    url: The server address, tcp://host:port or unix:///path
+    client_in_flight: Maximuim requests in flight per client.
+    link_in_flight: Maximuim requests in flight for all clients.
+    telemetry_interval: Position polling interval while clients are
+    subscribed (seconds)
+    """
+
+    def __init__(self,
+                 manager: ArmManager,
+                 url: str = 'tcp://127.0.0.1:5250',
+                 client_in_flight: int = 2,
+                 link_in_flight: int = 4,
+                 telemetry_interval: float = 0.2):
+        self._manager = manager
+        self.url = url
+        self.client_in_flight = int(client_in_flight)
+        self.link_in_flight = int(link_in_flight)
+        self.telemetry_interval = float(telemetry_interval)
+
+        self._cond = threading.Condition()
+        # Wakes the telemetry loop when a client subscribes or the server
+        # stops, it doesn't wait on _cond so admissions don't wake it.
+        self._telemetry_wake = threading.Event()
+        self._clients = collections.OrderedDict()
+        self._in_flight = 0
+        self._running = False
+        self._client_ids = itertools.count(1)
+
+        family, self._address = address_parse(url)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(self._address):
+                os.unlink(self._address)
+        else:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self._address)
+        if family != socket.AF_UNIX:
+            # Update the URL with the port chosen by the OS for port 0.
+            host, port = self._sock.getsockname()[:2]
+            self.url = f'tcp://{host}:{port}'
+
+    def start(self):
+        """
+        Start accepting client connections.
+        """
+        self._running = True
+        self._sock.listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        threading.Thread(target=self._telemetry_loop, daemon=True).start()
+
+    def stop(self):
+        """
+        Stop the server and close the client connections.
+        """
+        with self._cond:
+            self._running = False
+            clients = list(self._clients.values())
+            self._cond.notify_all()
+        self._telemetry_wake.set()
+        for client in clients:
+            client.close()
+        self._sock.close()
+        if self._sock.family == socket.AF_UNIX and os.path.exists(self._address):
+            os.unlink(self._address)
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                sock, _ = self._sock.accept()
+            except OSError:
+                break
+            client = ArmServerClient(self, sock, f'client-{next(self._client_ids)}')
+            with self._cond:
+                self._clients[client.name] = client
+            threading.Thread(target=client.writer_loop, daemon=True).start()
+            threading.Thread(target=self._reader_loop,
+                             args=(client,), daemon=True).start()
+
+    def _reader_loop(self, client: ArmServerClient):
+        """
+        Read the client's requests.
+        """
+        try:
+            while True:
+                request = frame_read(client.sock)
+                if request is None:
+                    break
+                self._request_handle(client, request)
+        except (OSError, ValueError) as e:
+            print(f'{client.name} Error: {e}')
+        with self._cond:
+            self._clients.pop(client.name, None)
+            client.pending.clear()
+            self._cond.notify_all()
+        client.close()
+
+    def _request_handle(self, client: ArmServerClient, request: dict):
+        req_id = request.get('id')
+        op = request.get('op')
+        args = request.get('args') or {}
+        if op == 'subscribe':
+            with self._cond:
+                client.subscribed = True
+                client.telemetry = None
+            self._telemetry_wake.set()
+            client.send({'id': req_id})
+        elif op == 'unsubscribe':
+            client.subscribed = False
+            client.send({'id': req_id})
+        elif op == 'jog':
+            # Jog updates don't wait for the link so they bypass admission.
+            try:
+                self._manager.jog(AxisType(args['axis']), args['velocity'])
+            except (KeyError, ValueError, TypeError) as e:
+                client.send({'id': req_id, 'error': str(e)})
+            else:
+                client.send({'id': req_id})
+        elif op == 'link_stats':
+            client.send({'id': req_id, 'link_stats': self._manager.link_stats()})
+        elif op in SERVER_COMMANDS:
+            with self._cond:
+                client.pending.append((req_id, op, args))
+                self._cond.notify_all()
+        else:
+            client.send({'id': req_id, 'error': f'Unknown Operation: {op}'})
+
+    def _dispatch_loop(self):
+        """
+        Admit client requests to the Arm link round robin between clients.
+        """
+        with self._cond:
+            while self._running:
+                client = self._client_next()
+                if client is None:
+                    self._cond.wait()
+                    continue
+                req_id, op, args = client.pending.popleft()
+                client.in_flight += 1
+                self._in_flight += 1
+                # Move the client to the end of the round robin order.
+                self._clients.move_to_end(client.name)
+                self._command_send(client, req_id, op, args)
+
+    def _client_next(self) -> ArmServerClient:
+        """
+        Returns the next client with a request which can be admitted.
+        """
+        if self._in_flight >= self.link_in_flight:
+            return None
+        for client in self._clients.values():
+            if client.pending and client.in_flight < self.client_in_flight:
+                return client
+        return None
+
+    def _command_send(self, client: ArmServerClient, req_id, op: str, args: dict):
+        """
+        Queue a client's command with the ArmManager.
+        """
+        completed = [False]
+
+        def done_cb(arm):
+            with self._cond:
+                # Some commands make more than one callback.
+                if completed[0]:
+                    return
+                completed[0] = True
+                client.in_flight -= 1
+                self._in_flight -= 1
+                self._cond.notify_all()
+            client.send({'id': req_id, 'arm': arm_dict(arm)})
+
+        try:
+            kwargs = {name: args[name] for name in SERVER_COMMANDS[op]
+                      if name in args}
+            if 'axis' in kwargs:
+                kwargs['axis'] = AxisType(kwargs['axis'])
+            getattr(self._manager, op)(cb=done_cb, **kwargs)
+        except (KeyError, ValueError, TypeError) as e:
+            completed[0] = True
+            client.in_flight -= 1
+            self._in_flight -= 1
+            client.send({'id': req_id, 'error': str(e)})
+
+    def _telemetry_loop(self):
+        """
+        Poll the Arm position while clients are subscribed.
+        """
+        while True:
+            with self._cond:
+                if not self._running:
+                    break
+                subscribed = any(client.subscribed
+                                 for client in self._clients.values())
+            if not subscribed:
+                self._telemetry_wake.wait()
+                self._telemetry_wake.clear()
+                continue
+            self._manager.get_pos_cmd(self._telemetry_cb)
+            # A subscribe during the wait doesn't need an extra poll.
+            self._telemetry_wake.wait(self.telemetry_interval)
+            self._telemetry_wake.clear()
+
+    def _telemetry_cb(self, arm: ArmSnapshot):
+        """
+        Send the changed telemetry values to each subscribed client.
+        """
+        current = arm_dict(arm)
+        with self._cond:
+            clients = [client for client in self._clients.values()
+                       if client.subscribed]
+        for client in clients:
+            previous = client.telemetry or {}
+            delta = {}
+            for group, values in current.items():
+                last = previous.get(group, {})
+                changed = {name: value for name, value in values.items()
+                           if last.get(name) != value}
+                if changed:
+                    delta[group] = changed
+            client.telemetry = current
+            if delta:
+                client.send({'telemetry': delta})
+
+
+class ArmClient:
+    """
+    Arm Server Client
+
+    Parameters:
+    url: The server address, tcp://host:port or unix:///path
+    cb_telemetry: Function to call with each telemetry delta dictionary.
+    """
+
+    def __init__(self, url: str = 'tcp://127.0.0.1:5250', cb_telemetry=None):
+        family, address = address_parse(url)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.connect(address)
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._futures = {}
+        self.cb_telemetry = cb_telemetry
+
+        """
+        The position and command counts by axis name, updated by the
+        telemetry deltas.
+        """
+        self.telemetry = {'position': {}, 'command': {}}
+        threading.Thread(target=self._reader_loop, daemon=True).start()
+
+    def request(self, op: str, **args) -> Future:
+        """
+        Send a request.  Returns a Future which completes with the response.
+        """
+        future = Future()
+        with self._lock:
+            req_id = next(self._ids)
+            self._futures[req_id] = future
+        data = frame_encode({'id': req_id, 'op': op, 'args': args})
+        with self._send_lock:
+            self._sock.sendall(data)
+        return future
+
+    def call(self, op: str, timeout: float = None, **args) -> dict:
+        """
+        Send a request and wait for the response.
+        """
+        return self.request(op, **args).result(timeout)
+
+    def subscribe(self) -> None:
+        """
+        Subscribe to telemetry.
+        """
+        self.call('subscribe')
+
+    def close(self):
+        self._sock.close()
+
+    def _reader_loop(self):
+        try:
+            while True:
+                frame = frame_read(self._sock)
+                if frame is None:
+                    break
+                if 'telemetry' in frame:
+                    delta = frame['telemetry']
+                    for group, values in delta.items():
+                        self.telemetry.setdefault(group, {}).update(values)
+                    if callable(self.cb_telemetry):
+                        self.cb_telemetry(delta)
+                    continue
+                with self._lock:
+                    future = self._futures.pop(frame.get('id'), None)
+                if future is None:
+                    continue
+                if 'error' in frame:
+                    future.set_exception(RuntimeError(frame['error']))
+                else:
+                    future.set_result(frame)
+        except (OSError, ValueError):
+            pass
+        # Fail any requests still waiting.
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.set_exception(ConnectionError('Server Connection Closed'))
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    port = sys.argv[1] if len(sys.argv) > 1 else '/dev/cu.usbserial-FT5ZVFRV'
+    url = sys.argv[2] if len(sys.argv) > 2 else 'tcp://127.0.0.1:5250'
+
+    manager = ArmManager(port)
+    manager.remote_cmd()
+    server = ArmServer(manager, url)
+    server.start()
+    print(f'Arm Server Listening on {server.url}')
+    while True:
+        manager.clock.sleep(1)